@@ -1,8 +1,18 @@
+import asyncio
 import logging
 import logging.config
 from pyrogram import Client
+from bot.auth import auth
+from bot.broadcast import broadcaster
 from bot.config import Config
+from bot.digest import new_users
+from bot.join_requests import join_requests
+from bot.metrics import sampler
+from bot.plugins.on_channel_media import channel_ingest
+from bot.scheduler import deleter
+from bot.sender import sender
 from bot.utils import add_admin, ensure_config, start_webserver, set_commands
+from database import db
 import pyromod
 # Get logging configurations
 
@@ -23,6 +33,18 @@ class Bot(Client):
 
     async def start(self):
         await super().start()
+        await db.ping()
+        await db.ensure_indexes()
+        await db.migrate()
+        if Config.DATABASE_EXPLAIN:
+            await db.check_query_plans()
+        if Config.CONFIG_CHANGE_STREAM:
+            self.config_watcher = asyncio.create_task(db.config.watch())
+        await db.files.load_ids()
+        await auth.load()
+        await sampler.sample()
+        sender.start()
+        deleter.start(self)
 
         me = await self.get_me()
         self.owner = await self.get_users(int(Config.OWNER_ID))
@@ -32,9 +54,23 @@ class Bot(Client):
         await add_admin(self.owner.id)
         logging.info(f"Bot started as {me.first_name} [{me.id}] - @{me.username}")
         logging.info(f"Owner: {self.owner.mention}")
+        await broadcaster.resume_running(self)
 
         if Config.WEB_SERVER:
             await start_webserver()
 
     async def stop(self, *args):
+        broadcaster.stop()
+        deleter.stop()
+        if Config.CONFIG_CHANGE_STREAM:
+            self.config_watcher.cancel()
+        # written before anything that can wait on Telegram for long
+        await db.counters.flush()
+        await new_users.flush(self)
+        await join_requests.flush(self)
+        await channel_ingest.close()
+        # handlers still sending need the sender until the dispatcher stops
         await super().stop()
+        sender.stop()
+        await db.counters.flush()
+        db.close()
@@ -0,0 +1,36 @@
+import logging
+from database import db
+
+
+class AuthSnapshot:
+    """In-memory copy of the admin and banned user ids"""
+
+    def __init__(self):
+        self.admins = set()
+        self.banned = set()
+
+    async def load(self):
+        admins = await db.config.get_value("ADMINS", [])
+        banned = await db.users.get_banned_user_ids()
+        self.admins = set(admins)
+        self.banned = set(banned)
+        logging.info(
+            f"Loaded {len(self.admins)} admins and {len(self.banned)} banned users"
+        )
+
+    def is_admin(self, user_id):
+        return user_id in self.admins
+
+    def is_banned(self, user_id):
+        return user_id in self.banned
+
+    async def ban_user(self, user_id):
+        await db.users.ban_user(user_id)
+        self.banned.add(user_id)
+
+    async def unban_user(self, user_id):
+        await db.users.unban_user(user_id)
+        self.banned.discard(user_id)
+
+
+auth = AuthSnapshot()
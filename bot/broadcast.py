@@ -0,0 +1,312 @@
+import asyncio
+import datetime
+import logging
+import time
+from collections import Counter
+from contextlib import suppress
+from pyrogram import Client, errors
+from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from pymongo.errors import PyMongoError
+from bot.config import Config
+from bot.scheduler import INSTANCE_ID
+from bot.sender import BULK, NORMAL, TokenBucket, sender
+from database import db
+from database.broadcasts import DONE, FAILED, PAUSED, RUNNING
+
+
+class RateController:
+    """AIMD pacing shared by all workers of one broadcast"""
+
+    def __init__(self, rate, min_rate, max_rate, increase=1, decrease=0.5):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.bucket = TokenBucket(rate, 1)
+        self.resume_at = 0
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    async def acquire(self):
+        delay = self.resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self.bucket.acquire()
+
+    def on_success(self):
+        self.set_rate(self.rate + self.increase / self.rate)
+
+    def on_flood_wait(self, seconds):
+        now = time.monotonic()
+        if now >= self.resume_at:
+            self.set_rate(self.rate * self.decrease)
+        self.resume_at = max(self.resume_at, now + seconds)
+
+    def set_rate(self, rate):
+        self.bucket.rate = min(self.max_rate, max(self.min_rate, rate))
+
+
+class BroadcastRunner:
+    """Runs the broadcast jobs stored in the ``broadcasts`` collection"""
+
+    def __init__(
+        self, workers, chunk_size, progress_interval, min_rate, max_rate, lease_seconds
+    ):
+        self.workers = workers
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.chunk_size = chunk_size
+        self.progress_interval = progress_interval
+        self.lease_seconds = lease_seconds
+        self.owner = INSTANCE_ID
+        self.tasks = {}
+        self.resumed = set()
+        self.cancelled = set()
+        self.stopped = False
+
+    def start(self, bot: Client, broadcast):
+        if broadcast["_id"] in self.tasks:
+            # still winding down after a pause, it restarts when done
+            self.resumed.add(broadcast["_id"])
+            return
+        self.tasks[broadcast["_id"]] = asyncio.create_task(self.run(bot, broadcast))
+
+    def cancel(self, broadcast_id):
+        """Stop sending right away, the queued users of the chunk are dropped"""
+        self.resumed.discard(broadcast_id)
+        if broadcast_id in self.tasks:
+            self.cancelled.add(broadcast_id)
+
+    async def resume_running(self, bot: Client):
+        """Take over the running jobs that no instance holds"""
+        if self.stopped:
+            return
+        for broadcast in await db.broadcasts.get_unclaimed():
+            if broadcast["_id"] not in self.tasks:
+                logging.info(f"Resuming broadcast {broadcast['_id']}")
+                self.start(bot, broadcast)
+
+    def stop(self):
+        # the jobs stay running in the database and resume on the next start
+        self.stopped = True
+        self.resumed.clear()
+        for task in self.tasks.values():
+            task.cancel()
+
+    async def run(self, bot: Client, broadcast):
+        broadcast_id = broadcast and broadcast["_id"]
+        broadcast = broadcast_id and await db.broadcasts.claim(
+            broadcast_id, self.owner, self.lease_seconds
+        )
+        if broadcast is None:
+            # paused, cancelled or finished before the task got to run, or
+            # another instance is sending it
+            self.tasks.pop(broadcast_id, None)
+            return
+
+        start_time = time.time()
+        counts = Counter()
+        unreachable = {}
+        queue = asyncio.Queue()
+        pacing = RateController(
+            (self.min_rate + self.max_rate) / 2, self.min_rate, self.max_rate
+        )
+        workers = [
+            asyncio.create_task(
+                self.worker(bot, broadcast, queue, counts, unreachable, pacing)
+            )
+            for _ in range(self.workers)
+        ]
+
+        def progress():
+            # the checkpointed counts plus those of the chunk being sent
+            current = dict(broadcast)
+            for name, amount in counts.items():
+                current[name] += amount
+            current["done"] += sum(counts.values())
+            return current
+
+        async def report_progress():
+            while True:
+                await asyncio.sleep(self.progress_interval)
+                await self.report(bot, progress(), pacing)
+
+        async def renew_lease():
+            # a chunk slowed down by FloodWaits can outlast the lease
+            while True:
+                await asyncio.sleep(self.lease_seconds / 3)
+                try:
+                    await db.broadcasts.renew_lease(
+                        broadcast_id, self.owner, self.lease_seconds
+                    )
+                except PyMongoError as e:
+                    logging.error(f"Could not renew broadcast lease: {e}")
+
+        reporter = asyncio.create_task(report_progress())
+        renewer = asyncio.create_task(renew_lease())
+        try:
+            while broadcast["status"] == RUNNING:
+                chunk = await self.next_chunk(broadcast)
+                if not chunk:
+                    if await db.broadcasts.set_status(broadcast["_id"], DONE, RUNNING):
+                        broadcast["status"] = DONE
+                    break
+                checkpoint = await self.send_chunk(
+                    broadcast, chunk, queue, counts, unreachable
+                )
+                if checkpoint is None:
+                    logging.warning(f"Broadcast {broadcast_id} was taken over, stopping")
+                    return
+                broadcast = checkpoint
+
+            reporter.cancel()
+            await self.report(bot, broadcast, pacing, time.time() - start_time)
+        except Exception as e:
+            logging.error(f"Broadcast {broadcast['_id']} failed: {e}")
+            reporter.cancel()
+            with suppress(Exception):
+                await db.broadcasts.set_status(broadcast["_id"], FAILED, RUNNING)
+                broadcast["status"] = FAILED
+                await self.report(bot, progress(), pacing)
+        finally:
+            reporter.cancel()
+            renewer.cancel()
+            for worker in workers:
+                worker.cancel()
+            with suppress(Exception):
+                await db.broadcasts.release(broadcast_id, self.owner)
+            self.tasks.pop(broadcast["_id"], None)
+            self.cancelled.discard(broadcast["_id"])
+            if broadcast["_id"] in self.resumed:
+                self.resumed.discard(broadcast["_id"])
+                # resumed while winding down, unless cancelled since
+                broadcast = await db.broadcasts.get_broadcast(broadcast["_id"])
+                if broadcast and broadcast["status"] == RUNNING:
+                    self.start(bot, broadcast)
+
+    async def next_chunk(self, broadcast, retries=3):
+        for attempt in range(retries):
+            try:
+                return await db.users.get_user_ids(
+                    broadcast["last_user_id"], self.chunk_size
+                )
+            except PyMongoError as e:
+                if attempt == retries - 1:
+                    raise
+                logging.warning(f"Could not read broadcast users, retrying: {e}")
+                await asyncio.sleep(2**attempt)
+
+    async def send_chunk(self, broadcast, chunk, queue, counts, unreachable):
+        for user_id in chunk:
+            queue.put_nowait(user_id)
+        await queue.join()
+        if unreachable:
+            # later broadcasts skip them
+            await db.users.mark_unreachable(unreachable)
+            unreachable.clear()
+        broadcast = await db.broadcasts.checkpoint(
+            broadcast["_id"], self.owner, self.lease_seconds, chunk[-1], dict(counts)
+        )
+        counts.clear()
+        return broadcast
+
+    async def worker(self, bot: Client, broadcast, queue, counts, unreachable, pacing):
+        while True:
+            user_id = await queue.get()
+            try:
+                if broadcast["_id"] in self.cancelled:
+                    continue
+                result = await broadcast_message(bot, user_id, broadcast, pacing)
+                counts[result] += 1
+                if result in ("blocked", "deleted"):
+                    unreachable[user_id] = result
+            finally:
+                queue.task_done()
+
+    async def report(self, bot: Client, broadcast, pacing, elapsed=None):
+        if not broadcast.get("status_message_id"):
+            return
+
+        if broadcast["status"] == RUNNING:
+            title = "Broadcast in progress"
+        elif elapsed is not None and broadcast["status"] == DONE:
+            time_taken = datetime.timedelta(seconds=int(elapsed))
+            title = f"Broadcast Completed:\nCompleted in {time_taken} seconds."
+        else:
+            title = f"Broadcast {broadcast['status']}"
+
+        text = (
+            f"{title}\n\nTotal Users {broadcast['total']}\n"
+            f"Completed: {broadcast['done']} / {broadcast['total']}\n"
+            f"Success: {broadcast['success']}\nBlocked: {broadcast['blocked']}\n"
+            f"Deleted: {broadcast['deleted']}"
+        )
+        if broadcast["status"] == RUNNING:
+            text += f"\nRate: {pacing.rate:.1f}/s"
+
+        chat_id = broadcast["status_chat_id"]
+        with suppress(Exception):
+            await sender.send(
+                NORMAL,
+                chat_id,
+                bot.edit_message_text,
+                chat_id,
+                broadcast["status_message_id"],
+                text,
+                reply_markup=get_broadcast_buttons(broadcast),
+            )
+
+
+def get_broadcast_buttons(broadcast):
+    _id = broadcast["_id"]
+    if broadcast["status"] == RUNNING:
+        toggle = InlineKeyboardButton("⏸ Pause", callback_data=f"broadcast_pause_{_id}")
+    elif broadcast["status"] in (PAUSED, FAILED):
+        toggle = InlineKeyboardButton("▶️ Resume", callback_data=f"broadcast_resume_{_id}")
+    else:
+        return None
+    cancel = InlineKeyboardButton("✖️ Cancel", callback_data=f"broadcast_cancel_{_id}")
+    return InlineKeyboardMarkup([[toggle, cancel]])
+
+
+async def broadcast_message(bot: Client, user_id, broadcast, pacing: RateController):
+    while True:
+        await pacing.acquire()
+        try:
+            await sender.send(
+                BULK,
+                user_id,
+                bot.copy_message,
+                user_id,
+                broadcast["chat_id"],
+                broadcast["message_id"],
+                # the pacing reacts to FloodWait instead of retrying blindly
+                retries=0,
+            )
+            pacing.on_success()
+            return "success"
+        except errors.FloodWait as e:
+            pacing.on_flood_wait(e.value)
+        except errors.InputUserDeactivated:
+            logging.info(f"{user_id} - Removed from Database, since deleted account.")
+            return "deleted"
+        except errors.UserIsBlocked:
+            logging.info(f"{user_id} -Blocked the bot.")
+            return "blocked"
+        except errors.PeerIdInvalid:
+            logging.info(f"{user_id} - PeerIdInvalid")
+            return "failed"
+        except Exception:
+            return "failed"
+
+
+broadcaster = BroadcastRunner(
+    Config.BROADCAST_WORKERS,
+    Config.BROADCAST_CHUNK_SIZE,
+    Config.BROADCAST_PROGRESS_INTERVAL,
+    Config.BROADCAST_MIN_RATE,
+    Config.BROADCAST_MAX_RATE,
+    Config.BROADCAST_LEASE_SECONDS,
+)
@@ -0,0 +1,82 @@
+import time
+from pyrogram import errors
+from bot.config import Config
+from database import db
+from database.cache import MISSING, SingleFlight, TTLCache
+
+# the bot lost its rights in the channel, or the channel or link is gone
+LOST_ACCESS_ERRORS = (
+    errors.ChatAdminRequired,
+    errors.ChannelPrivate,
+    errors.ChannelInvalid,
+    errors.ChatForbidden,
+    errors.InviteHashExpired,
+    errors.InviteHashInvalid,
+)
+
+
+class ChannelCache:
+    """Invite links and chat metadata of the force-sub channels"""
+
+    def __init__(self, chat_ttl, link_ttl):
+        self.link_ttl = link_ttl
+        self.invite_links = {}
+        self.chats = TTLCache(chat_ttl)
+        self.flights = SingleFlight()
+
+    def _is_fresh(self, link):
+        # links stored before expiry existed are plain strings
+        return isinstance(link, dict) and time.time() < link["created_at"] + self.link_ttl
+
+    async def get_invite_link(self, bot, channel_id, method):
+        key = f"{channel_id}_{method}"
+        link = self.invite_links.get(key)
+        if not self._is_fresh(link):
+            link = await self.flights.do(
+                key, self._load_invite_link, bot, channel_id, method
+            )
+        return link["link"]
+
+    async def _load_invite_link(self, bot, channel_id, method):
+        key = f"{channel_id}_{method}"
+        links = await db.config.get_value("invite_links", {})
+        link = links.get(key)
+        if not self._is_fresh(link):
+            invite_link = await bot.create_chat_invite_link(
+                channel_id, creates_join_request=(method == "request")
+            )
+            link = {"link": invite_link.invite_link, "created_at": time.time()}
+            await db.config.set_item("invite_links", key, link)
+        self.invite_links[key] = link
+        return link
+
+    async def invalidate(self, channel_id, method):
+        """Drop a link that may no longer work, the next request creates a new one"""
+        key = f"{channel_id}_{method}"
+        self.chats.pop(channel_id)
+        self.invite_links.pop(key, None)
+        await db.config.unset_item("invite_links", key)
+
+    async def get_chat(self, bot, channel_id):
+        chat = self.chats.get(channel_id)
+        if chat is MISSING:
+            chat = await self.flights.do(
+                ("chat", channel_id), self._load_chat, bot, channel_id
+            )
+        return chat
+
+    async def _load_chat(self, bot, channel_id):
+        chat = await bot.get_chat(channel_id)
+        self.chats.set(channel_id, chat)
+        return chat
+
+    async def forget(self, channel_id):
+        """Drop everything cached for a channel removed from force-sub"""
+        self.chats.pop(channel_id)
+        for method in ("direct", "request"):
+            key = f"{channel_id}_{method}"
+            self.invite_links.pop(key, None)
+            await db.config.unset_item("invite_links", key)
+
+
+channels = ChannelCache(Config.CHAT_CACHE_TTL, Config.INVITE_LINK_TTL)
@@ -28,6 +28,52 @@ class Config(object):
     LOG_CHANNEL = int(os.environ.get("LOG_CHANNEL", "0"))
     REDIRECT_WEBSITE = os.environ.get("REDIRECT_WEBSITE", None)
     DATABASE_NAME = os.environ.get("DATABASE_NAME", "advancefiletestbot")
+    DATABASE_MAX_POOL_SIZE = int(os.environ.get("DATABASE_MAX_POOL_SIZE", "50"))
+    DATABASE_MIN_POOL_SIZE = int(os.environ.get("DATABASE_MIN_POOL_SIZE", "0"))
+    DATABASE_TIMEOUT_MS = int(os.environ.get("DATABASE_TIMEOUT_MS", "10000"))
+    DATABASE_COMPRESSORS = os.environ.get("DATABASE_COMPRESSORS", "")
+    DATABASE_READ_PREFERENCE = os.environ.get("DATABASE_READ_PREFERENCE", "primary")
+    DATABASE_EXPLAIN = is_enabled(os.environ.get("DATABASE_EXPLAIN", "False"), False)
+    CONFIG_CACHE_TTL = int(os.environ.get("CONFIG_CACHE_TTL", "60"))
+    LINK_CACHE_SIZE = int(os.environ.get("LINK_CACHE_SIZE", "10000"))
+    LINK_CACHE_TTL = int(os.environ.get("LINK_CACHE_TTL", "300"))
+    UNKNOWN_LINK_TTL = int(os.environ.get("UNKNOWN_LINK_TTL", "60"))
+    LINK_FILTER_REFRESH_INTERVAL = int(
+        os.environ.get("LINK_FILTER_REFRESH_INTERVAL", "60")
+    )
+    CONFIG_CHANGE_STREAM = is_enabled(
+        os.environ.get("CONFIG_CHANGE_STREAM", "False"), False
+    )
+    COUNTER_FLUSH_INTERVAL = int(os.environ.get("COUNTER_FLUSH_INTERVAL", "5"))
+    COUNTER_MAX_PENDING = int(os.environ.get("COUNTER_MAX_PENDING", "1000"))
+    NEW_USER_DIGEST_INTERVAL = int(os.environ.get("NEW_USER_DIGEST_INTERVAL", "60"))
+    NEW_USER_DIGEST_SIZE = int(os.environ.get("NEW_USER_DIGEST_SIZE", "50"))
+    STATS_SAMPLE_INTERVAL = int(os.environ.get("STATS_SAMPLE_INTERVAL", "10"))
+    DELETE_SCHEDULE_HORIZON = int(os.environ.get("DELETE_SCHEDULE_HORIZON", "300"))
+    DELETE_LEASE_SECONDS = int(os.environ.get("DELETE_LEASE_SECONDS", "60"))
+    DEL_SCHEDULE_RETENTION = int(os.environ.get("DEL_SCHEDULE_RETENTION", "86400"))
+    GLOBAL_SEND_RATE = float(os.environ.get("GLOBAL_SEND_RATE", "25"))
+    CHAT_SEND_RATE = float(os.environ.get("CHAT_SEND_RATE", "1"))
+    CHAT_SEND_BURST = int(os.environ.get("CHAT_SEND_BURST", "3"))
+    BROADCAST_WORKERS = int(os.environ.get("BROADCAST_WORKERS", "25"))
+    BROADCAST_CHUNK_SIZE = int(os.environ.get("BROADCAST_CHUNK_SIZE", "500"))
+    BROADCAST_PROGRESS_INTERVAL = int(
+        os.environ.get("BROADCAST_PROGRESS_INTERVAL", "10")
+    )
+    BROADCAST_MIN_RATE = float(os.environ.get("BROADCAST_MIN_RATE", "1"))
+    BROADCAST_MAX_RATE = float(os.environ.get("BROADCAST_MAX_RATE", "20"))
+    BROADCAST_LEASE_SECONDS = int(os.environ.get("BROADCAST_LEASE_SECONDS", "60"))
+    CHAT_CACHE_TTL = int(os.environ.get("CHAT_CACHE_TTL", "3600"))
+    INVITE_LINK_TTL = int(os.environ.get("INVITE_LINK_TTL", "604800"))
+    MEMBERSHIP_TTL = int(os.environ.get("MEMBERSHIP_TTL", "86400"))
+    MEMBERSHIP_CACHE_TTL = int(os.environ.get("MEMBERSHIP_CACHE_TTL", "300"))
+    JOIN_REQUEST_FLUSH_INTERVAL = int(
+        os.environ.get("JOIN_REQUEST_FLUSH_INTERVAL", "2")
+    )
+    JOIN_REQUEST_MAX_PENDING = int(os.environ.get("JOIN_REQUEST_MAX_PENDING", "500"))
+    INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "50"))
+    INGEST_BATCH_DELAY = float(os.environ.get("INGEST_BATCH_DELAY", "1"))
+    AUTH_RESYNC_INTERVAL = int(os.environ.get("AUTH_RESYNC_INTERVAL", "300"))
     WEB_SERVER = is_enabled(os.environ.get("WEB_SERVER", "False"), False)
     CHANNELS = int(os.environ.get("CHANNELS", "0"))
 
@@ -42,8 +88,8 @@ class Script(object):
 
     NEW_USER_MESSAGE = """#NewUser
 
-🧾 Name : {mention}
-👤 User Id : `{user_id}`"""
+{users}"""
+    NEW_USER_LINE = "🧾 {mention} - `{user_id}`"
 
     NOT_ALLOWED_TEXT = "You are not allowed to send text messages here."
     ARROGANT_REPLY = "You are not my father, don't try to play with me"
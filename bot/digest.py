@@ -0,0 +1,65 @@
+import asyncio
+import io
+import logging
+from pyrogram import Client
+from bot.config import Config, Script
+from bot.sender import NORMAL, sender
+
+
+class NewUserDigest:
+    """Collects #NewUser notifications and posts them as one log channel message"""
+
+    def __init__(self, max_users):
+        self.max_users = max_users
+        self.users = []
+        self._lock = asyncio.Lock()
+        self._flush_task = None
+
+    def add(self, bot: Client, user):
+        self.users.append((user.mention, user.id, user.first_name))
+        if len(self.users) >= self.max_users and (
+            self._flush_task is None or self._flush_task.done()
+        ):
+            self._flush_task = asyncio.create_task(self.flush(bot))
+
+    async def flush(self, bot: Client):
+        async with self._lock:
+            users, self.users = self.users, []
+            if not users or not Config.LOG_CHANNEL:
+                return
+
+            lines = [
+                Script.NEW_USER_LINE.format(mention=mention, user_id=user_id)
+                for mention, user_id, _ in users
+            ]
+            text = Script.NEW_USER_MESSAGE.format(users="\n".join(lines))
+            try:
+                if len(text) <= 4096:
+                    await sender.send(
+                        NORMAL,
+                        Config.LOG_CHANNEL,
+                        bot.send_message,
+                        Config.LOG_CHANNEL,
+                        text,
+                    )
+                    return
+
+                # too long for one message, attach the full list instead
+                rows = [f"{user_id} - {name}" for _, user_id, name in users]
+                document = io.BytesIO("\n".join(rows).encode("utf-8"))
+                document.name = "new_users.txt"
+                await sender.send(
+                    NORMAL,
+                    Config.LOG_CHANNEL,
+                    bot.send_document,
+                    Config.LOG_CHANNEL,
+                    document,
+                    caption=Script.NEW_USER_MESSAGE.format(
+                        users=f"{len(users)} new users"
+                    ),
+                )
+            except Exception as e:
+                logging.error(f"Could not post the new user digest: {e}")
+
+
+new_users = NewUserDigest(Config.NEW_USER_DIGEST_SIZE)
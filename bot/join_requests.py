@@ -0,0 +1,82 @@
+import asyncio
+import logging
+from collections import defaultdict
+from pyrogram import Client, errors
+from bot.config import Config
+from bot.membership import memberships
+from bot.sender import NORMAL, sender
+from database import db
+
+
+class JoinRequestQueue:
+    """Collects force-sub join requests and handles them in batches"""
+
+    def __init__(self, max_pending):
+        self.max_pending = max_pending
+        self.direct = defaultdict(set)
+        self.requests = set()
+        self._lock = asyncio.Lock()
+        self._flush_task = None
+
+    def __len__(self):
+        return len(self.requests) + sum(len(users) for users in self.direct.values())
+
+    def is_queued(self, chat_id, user_id):
+        return (chat_id, user_id) in self.requests
+
+    def add(self, bot: Client, chat_id, user_id, method):
+        if method == "direct":
+            self.direct[chat_id].add(user_id)
+        else:
+            self.requests.add((chat_id, user_id))
+        if len(self) >= self.max_pending and (
+            self._flush_task is None or self._flush_task.done()
+        ):
+            self._flush_task = asyncio.create_task(self.flush(bot))
+
+    async def flush(self, bot: Client):
+        async with self._lock:
+            direct, self.direct = self.direct, defaultdict(set)
+            requests, self.requests = self.requests, set()
+
+            if requests:
+                try:
+                    await db.request_joins.add_requests(requests)
+                except Exception as e:
+                    logging.error(f"Could not save {len(requests)} join requests: {e}")
+
+            for chat_id, user_ids in direct.items():
+                try:
+                    await self.approve(bot, chat_id, user_ids)
+                except Exception as e:
+                    logging.error(f"Could not approve join requests in {chat_id}: {e}")
+
+    async def approve(self, bot: Client, chat_id, user_ids):
+        # only the batched users, so every approval is recorded below; the
+        # normal lane keeps them moving while a broadcast is held by FloodWait
+        approved = set()
+
+        async def approve_user(user_id):
+            try:
+                # paced on the user, only the global limit applies
+                await sender.send(
+                    NORMAL, user_id, bot.approve_chat_join_request, chat_id, user_id
+                )
+                approved.add(user_id)
+            except errors.UserAlreadyParticipant:
+                approved.add(user_id)
+            except errors.RPCError as e:
+                logging.info(f"Could not approve {user_id} in {chat_id}: {e}")
+
+        await asyncio.gather(*(approve_user(user_id) for user_id in user_ids))
+
+        # the approvals went through, a failed write only costs a re-check later
+        try:
+            await memberships.add_many(chat_id, approved)
+        except Exception as e:
+            logging.error(
+                f"Could not record {len(approved)} approved members of {chat_id}: {e}"
+            )
+
+
+join_requests = JoinRequestQueue(Config.JOIN_REQUEST_MAX_PENDING)
@@ -0,0 +1,42 @@
+from bot.config import Config
+from database import db
+from database.cache import TTLCache
+
+
+class MembershipTable:
+    """Verified force-sub memberships, in memory in front of the database"""
+
+    def __init__(self, cache_ttl):
+        self.cache = TTLCache(cache_ttl, 100000)
+
+    async def add(self, chat_id, user_id):
+        self.cache.set((chat_id, user_id), True)
+        await db.memberships.add_member(chat_id, user_id)
+
+    async def add_many(self, chat_id, user_ids):
+        if not user_ids:
+            return
+        for user_id in user_ids:
+            self.cache.set((chat_id, user_id), True)
+        await db.memberships.add_members(chat_id, user_ids)
+
+    async def remove(self, chat_id, user_id):
+        self.cache.pop((chat_id, user_id))
+        await db.memberships.remove_member(chat_id, user_id)
+
+    async def verified_channels(self, user_id, channel_ids):
+        """Return which of ``channel_ids`` the user is known to have joined"""
+        verified = {
+            channel_id
+            for channel_id in channel_ids
+            if self.cache.get((channel_id, user_id), False)
+        }
+        missing = set(channel_ids) - verified
+        if missing:
+            for channel_id in await db.memberships.get_verified_chats(user_id, missing):
+                self.cache.set((channel_id, user_id), True)
+                verified.add(channel_id)
+        return verified
+
+
+memberships = MembershipTable(Config.MEMBERSHIP_CACHE_TTL)
@@ -0,0 +1,47 @@
+import asyncio
+import os
+import shutil
+import time
+from collections import deque
+import psutil
+
+
+class SystemSampler:
+    """Rolling CPU, memory, event loop and disk figures for /stats"""
+
+    def __init__(self, window=12):
+        self.process = psutil.Process(os.getpid())
+        self.samples = deque(maxlen=window)
+        # the first cpu_percent call only sets the baseline
+        psutil.cpu_percent(interval=None)
+        self.process.cpu_percent(interval=None)
+
+    async def sample(self):
+        start = time.perf_counter()
+        await asyncio.sleep(0)
+        loop_lag = time.perf_counter() - start
+
+        total_disk, used_disk, free_disk = shutil.disk_usage("/")
+        self.samples.append(
+            {
+                "cpu_usage": psutil.cpu_percent(interval=None),
+                "process_cpu": self.process.cpu_percent(interval=None),
+                "ram_usage": psutil.virtual_memory().percent,
+                "rss": self.process.memory_info().rss,
+                "loop_lag": loop_lag,
+                "total_disk": total_disk,
+                "used_disk": used_disk,
+                "free_disk": free_disk,
+            }
+        )
+
+    def average(self, key):
+        if not self.samples:
+            return 0
+        return sum(sample[key] for sample in self.samples) / len(self.samples)
+
+    def latest(self, key):
+        return self.samples[-1][key] if self.samples else 0
+
+
+sampler = SystemSampler()
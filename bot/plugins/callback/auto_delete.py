@@ -15,6 +15,11 @@ async def auto_delete_config(bot: Client, message: types.CallbackQuery):
     )
     text += f"File Delete Time : {human_readable_time(file_delete_time.get('value', 0))}\n"
 
+    pending, oldest = await db.del_schedule.get_backlog()
+    text += f"\nPending Deletions : {pending}\n"
+    if oldest:
+        text += f"Oldest Pending : {oldest['time'].strftime('%d-%m-%Y %I:%M:%S %p')}\n"
+
     buttons = []
 
     buttons.append(
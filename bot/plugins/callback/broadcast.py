@@ -0,0 +1,44 @@
+from bson import ObjectId
+from pyrogram import Client, filters, types
+from bot.broadcast import broadcaster, get_broadcast_buttons
+from bot.utils import check
+from database import db
+from database.broadcasts import CANCELLED, FAILED, PAUSED, RUNNING
+
+
+@Client.on_callback_query(
+    filters.regex(pattern=r"^broadcast_(pause|resume|cancel)_[0-9a-f]{24}$")
+)
+@check
+async def broadcast_control(bot: Client, message: types.CallbackQuery):
+    _, action, broadcast_id = message.data.split("_")
+    broadcast_id = ObjectId(broadcast_id)
+
+    if action == "pause":
+        changed = await db.broadcasts.set_status(broadcast_id, PAUSED, RUNNING)
+        text = "Broadcast pauses after the current chunk"
+    elif action == "resume":
+        broadcast = await db.broadcasts.get_broadcast(broadcast_id)
+        changed = broadcast and broadcast["status"] in (PAUSED, FAILED)
+        if changed:
+            changed = await db.broadcasts.set_status(
+                broadcast_id, RUNNING, broadcast["status"]
+            )
+        text = "Broadcast resumed"
+    else:
+        broadcast = await db.broadcasts.get_broadcast(broadcast_id)
+        changed = broadcast and broadcast["status"] in (RUNNING, PAUSED)
+        if changed:
+            await db.broadcasts.set_status(broadcast_id, CANCELLED, broadcast["status"])
+            broadcaster.cancel(broadcast_id)
+        text = "Broadcast cancelled"
+
+    if not changed:
+        await message.answer("This broadcast can't be changed now", show_alert=True)
+        return
+
+    broadcast = await db.broadcasts.get_broadcast(broadcast_id)
+    if action == "resume":
+        broadcaster.start(bot, broadcast)
+    await message.answer(text)
+    await message.edit_message_reply_markup(get_broadcast_buttons(broadcast))
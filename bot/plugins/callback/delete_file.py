@@ -16,6 +16,6 @@ async def delete_file_cb(bot: Client, message: Message):
 
     _id = message.data.split("_", 2)[2]
 
-    await db.files.delete_file(_id)
+    await db.files.delete_file_by_id(_id)
 
     await handle_reply(message, key, "File deleted successfully", reply_markup=InlineKeyboardMarkup(Buttons.BACK_BUTTON))
@@ -1,5 +1,6 @@
 from contextlib import suppress
 from pyrogram import Client, filters, types, enums
+from bot.channels import channels
 from database import db
 
 
@@ -76,6 +77,7 @@ async def force_sub_delete_confirm(bot: Client, message: types.CallbackQuery):
 
     del force_sub[str(channel_id)]
     await db.config.update_config("force_sub_config", force_sub)
+    await channels.forget(channel_id)
     return await message.edit_message_text(
         text="Channel deleted from force sub config.",
         reply_markup=types.InlineKeyboardMarkup(
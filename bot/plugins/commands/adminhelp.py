@@ -14,6 +14,7 @@ async def admin(bot: Client, message: Message):
     text += " /delete - To Delete A File\n"
     text += " /broadcast - To Broadcast A Message\n"
     text += " /genlink - To Generate A Link\n"
+    text += " /dedupe - To Merge Duplicate Files\n"
     text += "\nOwner Only Commands\n\n"
     text += " /addadmin - To Add An Admin\n"
     text += " /removeadmin - To Remove An Admin\n"
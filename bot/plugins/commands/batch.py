@@ -1,7 +1,7 @@
 import random
 import string
 import pyrogram
-from bot.utils import check
+from bot.utils import check, get_media_descriptor
 from database import db
 
 
@@ -99,6 +99,7 @@ async def batch(bot: pyrogram.Client, message: pyrogram.types.Message):
         data = {
             "message_id": log.id,
             "chat_id": log.chat.id,
+            "media": get_media_descriptor(log),
         }
         batch_files.append(data)
 
@@ -0,0 +1,54 @@
+from collections import defaultdict
+from pyrogram import Client, filters
+from pyrogram.types import Message
+from bot.utils import check, get_media_descriptor
+from database import db
+
+
+@Client.on_message(filters.command("dedupe") & filters.private & filters.incoming)
+@check
+async def dedupe(bot: Client, message: Message):
+    sts = await message.reply_text("Looking for duplicate files...")
+
+    locations = await db.files.get_unique_locations()
+    checked = 0
+    aliases = 0
+    chunk = []
+    async for file in db.files.find_missing_unique_ids():
+        chunk.append(file)
+        if len(chunk) >= 200:
+            aliases += await merge_chunk(bot, chunk, locations)
+            checked += len(chunk)
+            chunk = []
+            await sts.edit(f"Checked {checked} files, merged {aliases} duplicates...")
+
+    if chunk:
+        aliases += await merge_chunk(bot, chunk, locations)
+        checked += len(chunk)
+
+    await sts.edit(
+        f"Checked {checked} files\nMerged {aliases} duplicates into their first copy"
+    )
+
+
+async def merge_chunk(bot: Client, files: list, locations: dict):
+    """Find the media of ``files``, fetching only those without a descriptor"""
+    medias = {}
+    missing = defaultdict(list)
+    for file in files:
+        media = file.get("media")
+        if media and media.get("file_unique_id"):
+            medias[file["_id"]] = media
+        else:
+            missing[file["chat_id"]].append(file)
+
+    for chat_id, chat_files in missing.items():
+        messages = await bot.get_messages(
+            chat_id, [file["message_id"] for file in chat_files]
+        )
+        for file, fetched in zip(chat_files, messages):
+            medias[file["_id"]] = get_media_descriptor(fetched)
+
+    return await db.files.merge_unique_ids(
+        [(file, medias[file["_id"]]) for file in files], locations
+    )
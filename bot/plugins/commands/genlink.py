@@ -2,7 +2,7 @@ from contextlib import suppress
 import re
 from pyrogram import Client, filters, types
 from database import db
-from bot.utils import check, human_readable_time
+from bot.utils import check, get_media_descriptor, human_readable_time
 from bot.config import Config
 import random
 import string
@@ -38,12 +38,23 @@ async def link_generator(client: Client, message: types.Message):
             )
             continue
 
-    _id = "".join(random.choice(string.ascii_lowercase) for _ in range(10))
-    await db.files.add_file(
-        _id,
-        message.from_user.id,
-        f"{msg_id}-{channel_id}",
-    )
+    # a post, or media, that already has a link keeps it
+    # only a forwarded post carries the media, links fill it in later
+    media = get_media_descriptor(channel_message)
+    file = await db.files.get_file_by_location(channel_id, msg_id)
+    if not file and media:
+        file = await db.files.get_file_by_unique_id(media["file_unique_id"])
+    if file:
+        _id = file["_id"]
+    else:
+        _id = "".join(random.choice(string.ascii_lowercase) for _ in range(10))
+        await db.files.add_file(
+            _id,
+            message.from_user.id,
+            channel_id,
+            msg_id,
+            media,
+        )
 
     link = f"https://t.me/{client.me.username}?start=download_{_id}"
     reply_markup = types.InlineKeyboardMarkup(
@@ -1,16 +1,12 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message
 from bot.config import Config, CONST
-from bot.utils import check
+from bot.join_requests import join_requests
+from bot.metrics import sampler
+from bot.sender import sender
+from bot.utils import check, human_size
 from database import db
-import psutil  # You'll need to install this package if not already installed
 from datetime import datetime, timedelta
-import shutil
-
-
-cpu_usage = psutil.cpu_percent()
-ram_usage = psutil.virtual_memory().percent
-total_disk, used_disk, free_disk = shutil.disk_usage("/")
 
 
 @Client.on_message(
@@ -21,8 +17,9 @@ total_disk, used_disk, free_disk = shutil.disk_usage("/")
 @Client.on_callback_query(filters.regex(pattern=r"^stats$"))
 @check
 async def stats(bot: Client, message: Message):
-    total_files = await db.files.col.count_documents({})
-    total_users = await db.users.col.count_documents({})
+    counters = db.stats.snapshot
+    lanes = sender.metrics()
+    link_cache = db.files.cache
     current_datetime = datetime.now()
 
     uptime = (current_datetime - CONST.START_TIME).total_seconds()
@@ -32,14 +29,21 @@ async def stats(bot: Client, message: Message):
     day = current_datetime.strftime("%A")
     utc = "+0530"
 
+    total_disk = sampler.latest("total_disk")
+    used_disk = sampler.latest("used_disk")
+    free_disk = sampler.latest("free_disk")
+
     bot_statistics = {
-        "cpu_usage": f"{cpu_usage:.1f}%",
-        "ram_usage": f"{ram_usage:.1f}%",
+        "cpu_usage": f"{sampler.average('cpu_usage'):.1f}%",
+        "process_cpu": f"{sampler.average('process_cpu'):.1f}%",
+        "ram_usage": f"{sampler.average('ram_usage'):.1f}%",
+        "rss": human_size(sampler.latest("rss")),
+        "loop_lag": f"{sampler.average('loop_lag') * 1000:.1f}ms",
         "disk_size": f"{total_disk / (1024 ** 3):.2f}GB",
         "disk_used": f"{used_disk / (1024 ** 3):.2f}GB",
         "free_disk": f"{free_disk / (1024 ** 3):.2f}GB",
         "uptime": f"{uptime}",
-        "disk_usage": f"{used_disk / total_disk * 100:.1f}%"
+        "disk_usage": f"{used_disk / total_disk * 100 if total_disk else 0:.1f}%"
     }
 
     text = f"""
@@ -57,13 +61,29 @@ async def stats(bot: Client, message: Message):
 ├🗂 Dɪꜱᴋ Uꜱᴇᴅ : {bot_statistics['disk_used']}
 ├📂 Fʀᴇᴇ Dɪꜱᴋ : {bot_statistics['free_disk']}
 ├🖥️ CPU : {bot_statistics['cpu_usage']}
+├⚙️ Bᴏᴛ CPU : {bot_statistics['process_cpu']}
 ├🚀 Rᴀᴍ : {bot_statistics['ram_usage']}
+├🧠 Bᴏᴛ Rᴀᴍ : {bot_statistics['rss']}
+├⏱ Lᴏᴏᴘ Lᴀɢ : {bot_statistics['loop_lag']}
 ├🗄 Dɪsᴋ : {bot_statistics['disk_usage']}
 │
+├───[📨 Sᴇɴᴅ Qᴜᴇᴜᴇ 📨]───⍟
+│
+├⚡ Iɴᴛᴇʀᴀᴄᴛɪᴠᴇ : {lanes['interactive']['queued']} queued, {lanes['interactive']['sent']} sent
+├📨 Nᴏʀᴍᴀʟ : {lanes['normal']['queued']} queued, {lanes['normal']['sent']} sent
+├📢 Bᴜʟᴋ : {lanes['bulk']['queued']} queued, {lanes['bulk']['sent']} sent
+├🐢 FʟᴏᴏᴅWᴀɪᴛs : {sum(lane['flood_waits'] for lane in lanes.values())}
+├🚪 Jᴏɪɴ Rᴇǫᴜᴇsᴛs : {len(join_requests)} queued
+│
 ├───[📑 Dᴀᴛᴀ Usᴀɢᴇ 📑]───⍟
 │
-├📥 Tᴏᴛᴀʟ Uᴘʟᴏᴀᴅ Fɪʟᴇs : {total_files}
-├📤 Tᴏᴛᴀʟ Usᴇʀs : {total_users}
+├📥 Tᴏᴛᴀʟ Uᴘʟᴏᴀᴅ Fɪʟᴇs : {counters['files']}
+├🗃 Tᴏᴛᴀʟ Bᴀᴛᴄʜᴇs : {counters['batches']}
+├📤 Tᴏᴛᴀʟ Usᴇʀs : {counters['users']}
+├🚫 Bᴀɴɴᴇᴅ Usᴇʀs : {counters['banned']}
+├⬇️ Tᴏᴛᴀʟ Dᴏᴡɴʟᴏᴀᴅs : {counters['downloads']}
+├🔥 Lɪɴᴋ Cᴀᴄʜᴇ : {len(link_cache)} links, {link_cache.hits} hits, {link_cache.misses} misses
+├❔ Uɴᴋɴᴏᴡɴ Lɪɴᴋs : {db.files.unknown_links}
 │
 ╰────────────────────⍟
 """
@@ -1,49 +1,137 @@
+import asyncio
+import logging
 import string
 import random
-from pyrogram import Client
+from pyrogram import Client, raw, types
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from bot.config import Config
-from bot.utils import handle_floodwait
+from bot.sender import BULK, sender
+from bot.utils import get_media_descriptor
 from database import db
 
 
-async def on_channel_media(bot: Client, message: Message):
-    message = await process_update_new_channel_message(bot, message)
-    if not message:
+class ChannelIngest:
+    """Stores new DB channel posts in batches"""
+
+    def __init__(self, batch_size, delay):
+        self.batch_size = batch_size
+        self.delay = delay
+        self.pending = []
+        self._lock = asyncio.Lock()
+        self._flush_task = None
+        self._flushes = set()
+        self._edits = set()
+
+    def add(self, message: Message):
+        self.pending.append(message)
+        if len(self.pending) >= self.batch_size:
+            flush = asyncio.create_task(self.flush())
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush_later())
+
+    async def flush_later(self):
+        await asyncio.sleep(self.delay)
+        await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            messages, self.pending = self.pending, []
+            if not messages:
+                return
+            try:
+                links = await self.store(messages)
+            except Exception as e:
+                logging.error(f"Could not store {len(messages)} channel posts: {e}")
+                return
+
+        for message in messages:
+            _id = links.get(message.id)
+            if _id is None:
+                continue
+            short_link = await get_shortened_link(message, _id)
+            edit = asyncio.create_task(update_message_reply_markup(message, short_link))
+            self._edits.add(edit)
+            edit.add_done_callback(self._edits.discard)
+
+    async def close(self, timeout=10):
+        """Store what is waiting and give the queued markup edits ``timeout`` seconds"""
+        if self._flush_task:
+            self._flush_task.cancel()
+        await self.flush()
+        await asyncio.gather(*self._flushes, return_exceptions=True)
+        if not self._edits:
+            return
+        _, pending = await asyncio.wait(self._edits, timeout=timeout)
+        if pending:
+            # the posts are stored, only their Open/Share buttons are missing
+            logging.warning(f"Dropped {len(pending)} channel markup edits on shutdown")
+            for edit in pending:
+                edit.cancel()
+
+    async def store(self, messages: list):
+        """Store the posts and map each message id to its link id"""
+        descriptors = {message.id: get_media_descriptor(message) for message in messages}
+        unique_ids = {
+            media["file_unique_id"] for media in descriptors.values() if media
+        }
+        # reposts of stored media and repeats within the batch keep one link
+        stored = await db.files.get_files_by_unique_ids(unique_ids)
+
+        links = {}
+        files = []
+        for message in messages:
+            media = descriptors[message.id]
+            unique_id = media["file_unique_id"] if media else None
+            if unique_id in stored:
+                links[message.id] = stored[unique_id]
+                continue
+            _id = generate_unique_id()
+            if unique_id:
+                stored[unique_id] = _id
+            links[message.id] = _id
+            files.append((_id, message.chat.id, message.id, media))
+
+        if files:
+            duplicates = await db.files.add_files(Config.OWNER_ID, files)
+            if duplicates:
+                # stored concurrently by another upload
+                unique_ids = {
+                    media["file_unique_id"]
+                    for _id, _, _, media in files
+                    if _id in duplicates and media
+                }
+                existing = await db.files.get_files_by_unique_ids(unique_ids)
+                for message_id, _id in list(links.items()):
+                    if _id in duplicates:
+                        media = descriptors[message_id]
+                        links[message_id] = media and existing.get(
+                            media["file_unique_id"]
+                        )
+        return links
+
+
+async def on_channel_media(bot: Client, update, users: dict, chats: dict):
+    raw_message = update.message
+    # cheap checks on the raw update first, most channel updates stop here
+    if not isinstance(raw_message.peer_id, raw.types.PeerChannel):
+        return
+    if int(f"-100{raw_message.peer_id.channel_id}") != Config.CHANNELS:
+        return
+    if not getattr(raw_message, "media", None) or raw_message.fwd_from:
         return
 
-    if message.sticker:
+    # the update carries the whole message, no need to fetch it again
+    message = await types.Message._parse(bot, raw_message, users, chats, replies=0)
+    if message.sticker or not message.media:
         return
 
     media = process_media(message)
     if not media:
         return
 
-    log = message
-
-    _id = generate_unique_id()
-    await db.files.add_file(
-        _id,
-        Config.OWNER_ID,
-        f"{log.id}-{log.chat.id}",
-    )
-
-    short_link = await get_shortened_link(log, _id)
-
-    await update_message_reply_markup(message, short_link)
-
-
-async def process_update_new_channel_message(bot, message):
-    message = message.message
-    if not message.media or message.fwd_from:
-        return None
-
-    channel_id = int(f"-100{message.peer_id.channel_id}")
-    if channel_id != Config.CHANNELS:
-        print(f"Channel {channel_id} != Config.CHANNELS")
-        return None
-    message.peer_id.channel_id = f"-100{message.peer_id.channel_id}"
-    return await bot.get_messages(message.peer_id.channel_id, message.id)
+    channel_ingest.add(message)
 
 
 def process_media(message):
@@ -65,7 +153,9 @@ async def get_shortened_link(message, _id):
 
 
 async def update_message_reply_markup(message: Message, short_link):
-    await handle_floodwait(
+    await sender.send(
+        BULK,
+        message.chat.id,
         message.edit_reply_markup,
         reply_markup=InlineKeyboardMarkup(
             [
@@ -82,3 +172,6 @@ async def update_message_reply_markup(message: Message, short_link):
             ]
         ),
     )
+
+
+channel_ingest = ChannelIngest(Config.INGEST_BATCH_SIZE, Config.INGEST_BATCH_DELAY)
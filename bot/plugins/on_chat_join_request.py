@@ -1,22 +1,14 @@
 from pyrogram import Client, types
 
-from bot.utils import add_request_join
+from bot.join_requests import join_requests
 from database import db
 
 
 @Client.on_chat_join_request()
 async def new_chat_member_main(app: Client, message: types.ChatJoinRequest):
-    force_sub = (await db.config.get_config("force_sub_config")) or {}
-    force_sub = force_sub.get("value", {})
-    if not force_sub:
+    force_sub = await db.config.get_value("force_sub_config", {})
+    sub = force_sub.get(str(message.chat.id))
+    if not sub or not sub["status"]:
         return
-    if str(message.chat.id) not in force_sub:
-        return
-    sub = force_sub[str(message.chat.id)]
-    if not sub["status"]:
-        return
-    if sub["method"] == "direct":
-        await message.approve()
-        return
-    if sub["method"] == "request":
-        await add_request_join(message.chat.id, message.from_user.id)
+    if sub["method"] in ("direct", "request"):
+        join_requests.add(app, message.chat.id, message.from_user.id, sub["method"])
@@ -0,0 +1,32 @@
+from pyrogram import Client, enums, types
+from bot.membership import memberships
+from database import db
+
+JOINED = (
+    enums.ChatMemberStatus.OWNER,
+    enums.ChatMemberStatus.ADMINISTRATOR,
+    enums.ChatMemberStatus.MEMBER,
+)
+
+
+@Client.on_chat_member_updated()
+async def on_chat_member_updated(bot: Client, update: types.ChatMemberUpdated):
+    force_sub = await db.config.get_value("force_sub_config", {})
+    if str(update.chat.id) not in force_sub:
+        return
+
+    member = update.new_chat_member or update.old_chat_member
+    if member is None or member.user is None:
+        return
+
+    new_member = update.new_chat_member
+    if new_member and (
+        new_member.status in JOINED
+        or (
+            new_member.status == enums.ChatMemberStatus.RESTRICTED
+            and new_member.is_member
+        )
+    ):
+        await memberships.add(update.chat.id, member.user.id)
+    else:
+        await memberships.remove(update.chat.id, member.user.id)
@@ -1,7 +1,9 @@
 from pyrogram import Client, filters
+from pymongo.errors import DuplicateKeyError
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from bot.config import Config
-from bot.utils import check, handle_floodwait
+from bot.sender import BULK, INTERACTIVE, NORMAL, sender
+from bot.utils import check, get_media_descriptor
 from database import db
 import random
 import string
@@ -16,7 +18,9 @@ async def on_media(bot: Client, message: Message):
 
 # Function to handle media messages
 async def handle_media_message(message):
-    sts = await message.reply_text("Processing...", quote=True)
+    sts = await sender.send(
+        INTERACTIVE, message.chat.id, message.reply_text, "Processing...", quote=True
+    )
     await process_media(message, sts)
 
 
@@ -30,26 +34,50 @@ async def process_media(message, sts):
     _id = "".join(random.choice(string.ascii_lowercase) for _ in range(10))
     text = message.caption.html if message.caption else ""
 
-    log: Message = await handle_floodwait(message.copy, Config.CHANNELS, caption=text)
+    # the same media uploaded again gets its existing link
+    media = get_media_descriptor(message)
+    file = media and await db.files.get_file_by_unique_id(media["file_unique_id"])
+    if file:
+        file_link = await get_shortened_link(message, file["_id"])
+        await sender.send(
+            INTERACTIVE, sts.chat.id, sts.edit, f"{text}\n\n**URL:** {file_link}"
+        )
+        return
 
-    await db.files.add_file(
-        _id,
-        message.from_user.id,
-        f"{log.id}-{log.chat.id}",
+    log: Message = await sender.send(
+        NORMAL, Config.CHANNELS, message.copy, Config.CHANNELS, caption=text
     )
 
+    try:
+        await db.files.add_file(
+            _id,
+            message.from_user.id,
+            log.chat.id,
+            log.id,
+            get_media_descriptor(log),
+        )
+    except DuplicateKeyError:
+        # uploaded twice at the same time, keep the first link
+        file = await db.files.get_file_by_unique_id(media["file_unique_id"])
+        _id = file["_id"]
+
     file_link = await get_shortened_link(log, _id)
 
     short_link = file_link
     text += f"\n\n**URL:** {short_link}"
 
-    await handle_floodwait(
+    await sender.send(
+        NORMAL,
+        message.from_user.id,
         log.copy,
         chat_id=message.from_user.id,
         caption=text,
         # reply_markup=markup,
     )
-    await log.edit_reply_markup(
+    await sender.send(
+        BULK,
+        log.chat.id,
+        log.edit_reply_markup,
         reply_markup=InlineKeyboardMarkup(
             [
                 [
@@ -66,4 +94,4 @@ async def process_media(message, sts):
         ),
     )
 
-    await sts.delete()
+    await sender.send(INTERACTIVE, sts.chat.id, sts.delete)
@@ -7,6 +7,6 @@ from bot.plugins.on_channel_media import on_channel_media
 @Client.on_raw_update()
 async def on_raw_update(bot, update, users, chats):
     if isinstance(update, UpdateNewChannelMessage):
-        await on_channel_media(bot, update)
+        await on_channel_media(bot, update, users, chats)
     else:
         raise ContinuePropagation
@@ -1,49 +1,100 @@
 import datetime
-from pyrogram import Client
+import functools
+import logging
+from collections import defaultdict
+from pyrogram import Client, enums, errors, types
 from pyrogram.types import Message
-from pyrogram.errors import FloodWait
-from bot.utils import human_readable_time
+from bot.config import Config
+from bot.scheduler import deleter
+from bot.sender import INTERACTIVE, sender
+from bot.utils import get_media_descriptor, human_readable_time
 from database import db
-from asyncio import sleep
+from database.cache import MISSING, SingleFlight, TTLCache
+
+# media that Telegram can group into one album, and the album kind it belongs to
+ALBUM_KINDS = {
+    "photo": "visual",
+    "video": "visual",
+    "document": "document",
+    "audio": "audio",
+}
+ALBUM_SIZE = 10
+INPUT_MEDIA = {
+    "photo": types.InputMediaPhoto,
+    "video": types.InputMediaVideo,
+    "document": types.InputMediaDocument,
+    "audio": types.InputMediaAudio,
+}
+# channel messages of recently opened links, keyed by (chat_id, message_id)
+source_messages = TTLCache(Config.LINK_CACHE_TTL, Config.LINK_CACHE_SIZE)
+message_flights = SingleFlight()
 
 
 async def get_file(bot: Client, message: Message):
     user_chat_id = message.from_user.id
+    command = message.command[1]
+
+    # resolve the link first, unknown ids cost no config reads
+    _, _, link_id = command.partition("_")
+    file = await db.files.get_link(link_id) if link_id else None
+    if not file:
+        await sender.send(
+            INTERACTIVE,
+            message.chat.id,
+            message.reply_text,
+            "Invalid Batch ID" if command.startswith("batch_") else "File Not Found",
+        )
+        return
 
     message_delete_time = await get_config_value("message_delete_time")
     file_delete_time = await get_config_value("file_delete_time")
 
-    command = message.command[1]
-
     if command.startswith("download_"):
-        file_id = command.split("_", 1)[1]
-        file = await db.files.col.find_one({"_id": file_id})
-
-        if not file:
-            await message.reply_text("File Not Found")
-            return
-        await db.users.update_user(user_chat_id, {"files_received": 1}, "inc")
+        file_id = file["_id"]
+        db.counters.incr("users", user_chat_id, "files_received")
+        db.counters.incr("files", file_id, "downloads")
+        db.stats.incr("downloads")
         file_message = await handle_file(
             bot, user_chat_id, file, message_delete_time, file_delete_time
         )
         if not file_message:
-            await message.reply_text("File Not Found")
+            await sender.send(
+                INTERACTIVE, message.chat.id, message.reply_text, "File Not Found"
+            )
 
     elif command.startswith("batch_"):
-        await batch_handler(bot, message, message_delete_time, file_delete_time)
+        await batch_handler(bot, message, file, message_delete_time, file_delete_time)
 
     await schedule_deletion(message.chat.id, message.id, file_delete_time)
 
 
 async def get_config_value(key: str, default: int = 0):
-    config = await db.config.get_config(key)
-    return config.get("value", default)
+    return await db.config.get_value(key, default)
 
 
 async def schedule_deletion(chat_id: int, message_id: int, delete_time: int):
     if delete_time > 0:
         time = datetime.datetime.now() + datetime.timedelta(seconds=delete_time)
-        await db.del_schedule.add_schedule(chat_id, message_id, time)
+        schedule = await db.del_schedule.add_schedule(chat_id, message_id, time)
+        deleter.push(schedule)
+
+
+async def schedule_deletions(chat_id: int, messages: list):
+    """Schedule ``(message_id, delete_time)`` pairs of one chat in a single write"""
+    now = datetime.datetime.now()
+    schedules = await db.del_schedule.add_schedules(
+        [
+            {
+                "chat_id": chat_id,
+                "message_id": message_id,
+                "time": now + datetime.timedelta(seconds=delete_time),
+            }
+            for message_id, delete_time in messages
+            if delete_time > 0
+        ]
+    )
+    for schedule in schedules:
+        deleter.push(schedule)
 
 
 async def handle_file(
@@ -53,69 +104,222 @@ async def handle_file(
     message_delete_time: int,
     file_delete_time: int,
 ):
-    message_id, chat_id = map(int, file["log"].split("-", 1))
-    message = await bot.get_messages(chat_id, message_id)
+    file_message = await sender.send(
+        INTERACTIVE,
+        user_chat_id,
+        send_file,
+        bot,
+        user_chat_id,
+        file,
+        functools.partial(db.files.set_media, file["_id"]),
+    )
 
-    if message.empty:
+    if not file_message:
         return None
 
-    caption = message.caption.html if message.caption else ""
-    file_message = await copy_message(message, user_chat_id, caption=caption[:1000], reply_markup=None)
-
-    temp_message = await file_message.reply_text(
+    temp_message = await sender.send(
+        INTERACTIVE,
+        user_chat_id,
+        file_message.reply_text,
         f"⏳𝖡𝖾𝖿𝗈𝗋𝖾 𝖽𝗈𝗐𝗇𝗅𝗈𝖺𝖽𝗂𝗇𝗀 𝗍𝗁𝖾 𝖿𝗂𝗅𝖾𝗌, 𝗉𝗅𝖾𝖺𝗌𝖾 𝗍𝗋𝖺𝗇𝗌𝖿𝖾𝗋 𝗍𝗁𝖾𝗆 𝗍𝗈 𝖺𝗇𝗈𝗍𝗁𝖾𝗋 𝗅𝗈𝖼𝖺𝗍𝗂𝗈𝗇 𝗈𝗋 𝗌𝖺𝗏𝖾 𝗍𝗁𝖾𝗆 𝗂𝗇 𝖲𝖺𝗏𝖾𝖽 𝖬𝖾𝗌𝗌𝖺𝗀𝖾𝗌, 𝖳𝗁𝖾𝗒 𝗐𝗂𝗅𝗅 𝖻𝖾 𝖽𝖾𝗅𝖾𝗍𝖾𝖽 𝗂𝗇 {human_readable_time(message_delete_time)}."
     )
 
-    await schedule_deletion(temp_message.chat.id, temp_message.id, message_delete_time)
-    await schedule_deletion(file_message.chat.id, file_message.id, file_delete_time)
+    await schedule_deletions(
+        user_chat_id,
+        [(temp_message.id, message_delete_time), (file_message.id, file_delete_time)],
+    )
 
     return file_message
 
 
 async def batch_handler(
-    bot: Client, message: Message, message_delete_time: int, file_delete_time: int
+    bot: Client,
+    message: Message,
+    batch: dict,
+    message_delete_time: int,
+    file_delete_time: int,
 ):
     user_chat_id = message.from_user.id
-    _, batch_id = message.command[1].split("_", 1)
+    batch_id = batch["_id"]
 
-    batch = await db.files.get_batch(batch_id)
-    if not batch:
-        await message.reply_text("Invalid Batch ID")
-        return
+    # the batch record is cached and shared, descriptors go into a copy
+    files = list(batch["files"])
+    total_files = len(files)
+    db.counters.incr("users", user_chat_id, "files_received", total_files)
+    db.counters.incr("files", batch_id, "downloads")
+    db.stats.incr("downloads", total_files)
+
+    messages = await fetch_batch_messages(bot, batch_id, files)
 
     del_files = []
-    total_files = len(batch["files"])
-    await db.users.update_user(user_chat_id, {"files_received": total_files}, "inc")
-    for file in batch["files"]:
-        message_id, chat_id = file["message_id"], file["chat_id"]
-        message = await bot.get_messages(chat_id, message_id)
+    for group in group_albums(files, messages):
+        del_files.extend(
+            await send_group(bot, user_chat_id, batch_id, files, messages, group)
+        )
+
+    temp_message = await sender.send(
+        INTERACTIVE,
+        message.chat.id,
+        message.reply_text,
+        f"⏳𝖡𝖾𝖿𝗈𝗋𝖾 𝖽𝗈𝗐𝗇𝗅𝗈𝖺𝖽𝗂𝗇𝗀 𝗍𝗁𝖾 𝖿𝗂𝗅𝖾𝗌, 𝗉𝗅𝖾𝖺𝗌𝖾 𝗍𝗋𝖺𝗇𝗌𝖿𝖾𝗋 𝗍𝗁𝖾𝗆 𝗍𝗈 𝖺𝗇𝗈𝗍𝗁𝖾𝗋 𝗅𝗈𝖼𝖺𝗍𝗂𝗈𝗇 𝗈𝗋 𝗌𝖺𝗏𝖾 𝗍𝗁𝖾𝗆 𝗂𝗇 𝖲𝖺𝗏𝖾𝖽 𝖬𝖾𝗌𝗌𝖺𝗀𝖾𝗌, 𝖳𝗁𝖾𝗒 𝗐𝗂𝗅𝗅 𝖻𝖾 𝖽𝖾𝗅𝖾𝗍𝖾𝖽 𝗂𝗇 {human_readable_time(message_delete_time)}."
+    )
+
+    await schedule_deletions(
+        user_chat_id,
+        [(temp_message.id, message_delete_time)]
+        + [(file_message_id, file_delete_time) for file_message_id in del_files],
+    )
+
 
-        if message.empty:
+async def fetch_batch_messages(bot: Client, batch_id: str, files: list):
+    """Fetch the batch items that have no media descriptor yet, one call per chat"""
+    missing = defaultdict(list)
+    for index, file in enumerate(files):
+        if not file.get("media"):
+            missing[file["chat_id"]].append(index)
+
+    messages = {}
+    medias = {}
+    for chat_id, indexes in missing.items():
+        uncached = []
+        for index in indexes:
+            cached = source_messages.get((chat_id, files[index]["message_id"]))
+            if cached is MISSING:
+                uncached.append(index)
+            else:
+                messages[index] = cached
+
+        for i in range(0, len(uncached), 200):
+            chunk = uncached[i : i + 200]
+            fetched = await bot.get_messages(
+                chat_id, [files[index]["message_id"] for index in chunk]
+            )
+            for index, fetched_message in zip(chunk, fetched):
+                messages[index] = fetched_message
+                key = (chat_id, files[index]["message_id"])
+                source_messages.set(key, fetched_message)
+
+        for index in indexes:
+            media = get_media_descriptor(messages[index])
+            if media:
+                files[index] = {**files[index], "media": media}
+                medias[index] = media
+
+    if medias:
+        await db.files.set_batch_media(batch_id, medias)
+    return messages
+
+
+def group_albums(files: list, messages: dict):
+    """Split batch items into albums of compatible media and single sends"""
+    group, group_kind = [], None
+    for index, file in enumerate(files):
+        message = messages.get(index)
+        if message is not None and message.empty:
             continue
 
-        caption = message.caption.html if message.caption else ""
-        caption = caption[:1000]
+        media = file.get("media")
+        kind = ALBUM_KINDS.get(media["type"]) if media else None
+        if group and (kind != group_kind or kind is None or len(group) >= ALBUM_SIZE):
+            yield group
+            group = []
+        group.append(index)
+        group_kind = kind
+
+    if group:
+        yield group
+
+
+async def send_group(
+    bot: Client, chat_id: int, batch_id: str, files: list, messages: dict, group: list
+):
+    if len(group) > 1:
+        media_group = [
+            INPUT_MEDIA[files[index]["media"]["type"]](
+                files[index]["media"]["file_id"],
+                caption=files[index]["media"]["caption"],
+                parse_mode=enums.ParseMode.HTML,
+            )
+            for index in group
+        ]
         try:
-            file_message = await copy_message(
-                message, user_chat_id, caption=caption, reply_markup=None
+            sent = await sender.send(
+                INTERACTIVE, chat_id, bot.send_media_group, chat_id, media_group
             )
-        except FloodWait as e:
-            await sleep(e.value)
-            file_message = await copy_message(
-                message, user_chat_id, caption=caption, reply_markup=None
+            return [file_message.id for file_message in sent]
+        except (errors.BadRequest, ValueError) as e:
+            logging.info(f"Album failed, sending the files one by one: {e}")
+
+    sent = []
+    for index in group:
+        save_media = functools.partial(save_batch_media, batch_id, index)
+        file_message = await sender.send(
+            INTERACTIVE,
+            chat_id,
+            send_file,
+            bot,
+            chat_id,
+            files[index],
+            save_media,
+            messages.get(index),
+        )
+        if file_message:
+            sent.append(file_message.id)
+    return sent
+
+
+async def save_batch_media(batch_id: str, index: int, media: dict):
+    await db.files.set_batch_media(batch_id, {index: media})
+
+
+async def send_file(
+    bot: Client, chat_id: int, file: dict, save_media, message: Message = None
+):
+    """Send a stored file by its cached file_id, falling back to copying the
+    channel message. The fallback refreshes the cached descriptor through
+    ``save_media``, which is also how files stored without one get it."""
+    media = file.get("media")
+    if media:
+        try:
+            return await bot.send_cached_media(
+                chat_id,
+                media["file_id"],
+                caption=media["caption"],
+                parse_mode=enums.ParseMode.HTML,
             )
+        except (errors.BadRequest, ValueError) as e:
+            logging.info(f"Cached file_id failed, copying the message instead: {e}")
 
-        del_files.append(file_message.id)
-        await sleep(1)
+    if message is None:
+        message = await get_source_message(bot, file["chat_id"], file["message_id"])
+    if message.empty:
+        return None
 
-    temp_message = await message.reply_text(
-        f"⏳𝖡𝖾𝖿𝗈𝗋𝖾 𝖽𝗈𝗐𝗇𝗅𝗈𝖺𝖽𝗂𝗇𝗀 𝗍𝗁𝖾 𝖿𝗂𝗅𝖾𝗌, 𝗉𝗅𝖾𝖺𝗌𝖾 𝗍𝗋𝖺𝗇𝗌𝖿𝖾𝗋 𝗍𝗁𝖾𝗆 𝗍𝗈 𝖺𝗇𝗈𝗍𝗁𝖾𝗋 𝗅𝗈𝖼𝖺𝗍𝗂𝗈𝗇 𝗈𝗋 𝗌𝖺𝗏𝖾 𝗍𝗁𝖾𝗆 𝗂𝗇 𝖲𝖺𝗏𝖾𝖽 𝖬𝖾𝗌𝗌𝖺𝗀𝖾𝗌, 𝖳𝗁𝖾𝗒 𝗐𝗂𝗅𝗅 𝖻𝖾 𝖽𝖾𝗅𝖾𝗍𝖾𝖽 𝗂𝗇 {human_readable_time(message_delete_time)}."
+    caption = message.caption.html if message.caption else ""
+    file_message = await copy_message(
+        message, chat_id, caption=caption[:1000], reply_markup=None
     )
 
-    await schedule_deletion(temp_message.chat.id, temp_message.id, message_delete_time)
+    media = get_media_descriptor(message)
+    if media:
+        await save_media(media)
+    return file_message
+
 
-    for file_message_id in del_files:
-        await schedule_deletion(user_chat_id, file_message_id, file_delete_time)
+async def get_source_message(bot: Client, chat_id: int, message_id: int):
+    key = (chat_id, message_id)
+    message = source_messages.get(key)
+    if message is MISSING:
+        message = await message_flights.do(
+            key, fetch_source_message, bot, chat_id, message_id
+        )
+    return message
+
+
+async def fetch_source_message(bot: Client, chat_id: int, message_id: int):
+    message = await bot.get_messages(chat_id, message_id)
+    source_messages.set((chat_id, message_id), message)
+    return message
 
 
 async def copy_message(message: Message, chat_id: int, **kwargs):
@@ -0,0 +1,151 @@
+import asyncio
+import datetime
+import heapq
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import defaultdict
+from pyrogram import Client, errors
+from bot.config import Config
+from database import db
+
+# Telegram accepts at most 100 message ids per delete_messages call
+DELETE_CHUNK_SIZE = 100
+# lease owner of this process, unique across hosts and restarts
+INSTANCE_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class DeleteScheduler:
+    """Runs auto-delete schedules at their due time"""
+
+    def __init__(self, horizon, lease_seconds):
+        self.horizon = horizon
+        self.lease_seconds = lease_seconds
+        self.owner = INSTANCE_ID
+        self.heap = []
+        self.queued = set()
+        self.wakeup = asyncio.Event()
+        self.next_reload = 0
+        self.task = None
+
+    def push(self, schedule):
+        until = datetime.datetime.now() + datetime.timedelta(seconds=self.horizon)
+        if schedule["_id"] in self.queued or schedule["time"] > until:
+            return
+        self.queued.add(schedule["_id"])
+        heapq.heappush(self.heap, (schedule["time"], schedule["_id"], schedule))
+        if self.heap[0][1] == schedule["_id"]:
+            self.wakeup.set()
+
+    async def reload(self):
+        until = datetime.datetime.now() + datetime.timedelta(seconds=self.horizon)
+        for schedule in await db.del_schedule.get_due_schedules(until):
+            self.push(schedule)
+        self.next_reload = time.monotonic() + self.horizon / 2
+
+    def pop_due(self):
+        now = datetime.datetime.now()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            _, _id, schedule = heapq.heappop(self.heap)
+            self.queued.discard(_id)
+            due.append(schedule)
+        return due
+
+    def seconds_until_next(self):
+        timeout = self.next_reload - time.monotonic()
+        if self.heap:
+            due_in = (self.heap[0][0] - datetime.datetime.now()).total_seconds()
+            timeout = min(timeout, due_in)
+        return max(timeout, 0)
+
+    async def process(self, bot: Client, schedules):
+        """Delete due messages chat by chat, 100 ids per API call"""
+        schedule_ids = [schedule["_id"] for schedule in schedules]
+        schedules = await db.del_schedule.claim_schedules(
+            schedule_ids, self.owner, self.lease_seconds
+        )
+        if not schedules:
+            return
+        schedule_ids = [schedule["_id"] for schedule in schedules]
+
+        chats = defaultdict(list)
+        for schedule in schedules:
+            chats[schedule["chat_id"]].append(schedule)
+
+        # FloodWait sleeps can outlast the lease, keep it alive the whole time
+        renewer = asyncio.create_task(self.renew_leases(schedule_ids))
+        try:
+            for chat_id, chat_schedules in chats.items():
+                for i in range(0, len(chat_schedules), DELETE_CHUNK_SIZE):
+                    chunk = chat_schedules[i : i + DELETE_CHUNK_SIZE]
+                    await self.delete_messages(
+                        bot, chat_id, [schedule["message_id"] for schedule in chunk]
+                    )
+        finally:
+            renewer.cancel()
+
+        await db.del_schedule.mark_done(schedule_ids)
+
+    async def renew_leases(self, schedule_ids):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await db.del_schedule.renew_leases(
+                    schedule_ids, self.owner, self.lease_seconds
+                )
+            except Exception as e:
+                logging.error(f"Could not renew auto delete leases: {e}")
+
+    async def delete_messages(self, bot: Client, chat_id, message_ids):
+        while True:
+            try:
+                return await bot.delete_messages(chat_id, message_ids)
+            except errors.FloodWait as e:
+                # the worker is sequential, so this backs off every chat
+                logging.warning(f"Auto delete hit FloodWait, sleeping {e.value}s")
+                await asyncio.sleep(e.value)
+            except errors.MessageDeleteForbidden:
+                return
+            except Exception as e:
+                logging.error(f"Could not delete messages in {chat_id}: {e}")
+                return
+
+    async def run(self, bot: Client):
+        while True:
+            try:
+                # cleared first so a push during the reload still wakes us up
+                self.wakeup.clear()
+                if time.monotonic() >= self.next_reload:
+                    await self.reload()
+
+                due = self.pop_due()
+                if due:
+                    await self.process(bot, due)
+                    continue
+
+                try:
+                    await asyncio.wait_for(
+                        self.wakeup.wait(), timeout=self.seconds_until_next()
+                    )
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.exception(f"Delete scheduler error: {e}")
+                await asyncio.sleep(5)
+
+    def start(self, bot: Client):
+        self.task = asyncio.create_task(self.run(bot))
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+
+
+deleter = DeleteScheduler(
+    Config.DELETE_SCHEDULE_HORIZON, Config.DELETE_LEASE_SECONDS
+)
@@ -0,0 +1,166 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import Counter
+from pyrogram import errors
+from bot.config import Config
+
+# priority lanes, lower runs first
+INTERACTIVE = 0
+NORMAL = 1
+BULK = 2
+LANES = {INTERACTIVE: "interactive", NORMAL: "normal", BULK: "bulk"}
+
+
+class TokenBucket:
+    """Allows ``rate`` operations per second with bursts of up to ``burst``"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        """Take a token and return how long to wait before using it"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class ChatPacer:
+    """Keeps sends to each chat under Telegram's per-chat limit"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+
+    def bucket(self, chat_id):
+        bucket = self.buckets.get(chat_id)
+        if bucket is None:
+            if len(self.buckets) > 10000:
+                self.prune()
+            bucket = self.buckets[chat_id] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    async def acquire(self, chat_id):
+        await self.bucket(chat_id).acquire()
+
+    def penalize(self, chat_id, seconds):
+        """Hold back the chat for ``seconds`` after a FloodWait"""
+        bucket = self.bucket(chat_id)
+        bucket.reserve()
+        bucket.tokens = min(bucket.tokens, -seconds * bucket.rate)
+
+    def prune(self):
+        """Forget chats whose bucket has refilled, they behave like new ones"""
+        now = time.monotonic()
+        self.buckets = {
+            chat_id: bucket
+            for chat_id, bucket in self.buckets.items()
+            if bucket.tokens + (now - bucket.updated) * bucket.rate < bucket.burst
+        }
+
+
+class OutboundScheduler:
+    """Routes outbound Telegram calls through one global and per-chat limiter"""
+
+    def __init__(self, global_rate, chat_rate, chat_burst, max_retries=3):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chats = ChatPacer(chat_rate, chat_burst)
+        self.max_retries = max_retries
+        self.queue = asyncio.PriorityQueue()
+        self.order = itertools.count()
+        self.paused_until = Counter()
+        self.depth = Counter()
+        self.sent = Counter()
+        self.flood_waits = Counter()
+        self.turns = set()
+        self.stopped = False
+        self.task = None
+
+    async def send(self, lane, chat_id, func, *args, retries=None, **kwargs):
+        retries = self.max_retries if retries is None else retries
+        while True:
+            await self.chats.acquire(chat_id)
+            await self.wait_turn(lane)
+            try:
+                return await func(*args, **kwargs)
+            except errors.FloodWait as e:
+                self.flood_waits[lane] += 1
+                self.chats.penalize(chat_id, e.value)
+                if lane == BULK:
+                    self.paused_until[lane] = time.monotonic() + e.value
+                if retries <= 0:
+                    raise
+                retries -= 1
+                logging.warning(f"FloodWait of {e.value}s in {LANES[lane]} lane, retrying")
+
+    async def wait_turn(self, lane):
+        if self.stopped:
+            raise RuntimeError("The outbound scheduler is stopped")
+        turn = asyncio.get_running_loop().create_future()
+        self.depth[lane] += 1
+        self.turns.add(turn)
+        self.queue.put_nowait((lane, next(self.order), turn))
+        try:
+            await turn
+        finally:
+            self.turns.discard(turn)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.queue.get()
+            lane, _, turn = item
+            if turn.done():
+                # the caller was cancelled while waiting
+                self.depth[lane] -= 1
+                continue
+
+            paused = self.paused_until[lane] - time.monotonic()
+            if paused > 0:
+                loop.call_later(paused, self.queue.put_nowait, item)
+                continue
+
+            await self.global_bucket.acquire()
+            self.depth[lane] -= 1
+            if not turn.done():
+                turn.set_result(None)
+                self.sent[lane] += 1
+
+    def metrics(self):
+        return {
+            name: {
+                "queued": self.depth[lane],
+                "sent": self.sent[lane],
+                "flood_waits": self.flood_waits[lane],
+            }
+            for lane, name in LANES.items()
+        }
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        self.stopped = True
+        if self.task:
+            self.task.cancel()
+        # nothing grants turns any more, callers still waiting must not hang
+        for turn in self.turns:
+            if not turn.done():
+                turn.set_exception(RuntimeError("The outbound scheduler is stopped"))
+
+
+sender = OutboundScheduler(
+    Config.GLOBAL_SEND_RATE, Config.CHAT_SEND_RATE, Config.CHAT_SEND_BURST
+)
@@ -3,7 +3,9 @@ import datetime
 import logging
 import math
 from aiohttp import web
+from bot.auth import auth
 from bot.config import Script
+from bot.join_requests import join_requests
 from database import db
 from pyrogram import types, Client, errors
 import functools
@@ -32,9 +34,7 @@ async def start_webserver():
 
 
 async def add_new_user(user_id):
-    if not await db.users.col.find_one({"_id": user_id}):
-        await db.users.add_user(user_id)
-        return True
+    return await db.users.add_user(user_id)
 
 
 async def set_commands(app: Client):
@@ -47,6 +47,7 @@ async def set_commands(app: Client):
         types.BotCommand("broadcast", "Broadcast a message"),
         types.BotCommand("delete", "Delete a file"),
         types.BotCommand("genlink", "Generate a link"),
+        types.BotCommand("dedupe", "Merge duplicate files"),
         types.BotCommand("stats", "Get bot stats"),
         types.BotCommand("user", "Get user details"),
         types.BotCommand("help", "Help message"),
@@ -125,6 +126,21 @@ def get_file_details(message):
     )
 
 
+def get_media_descriptor(message):
+    """What send_cached_media needs to resend a media message without fetching it"""
+    if not message.media:
+        return None
+    media = getattr(message, message.media.value, None)
+    if not getattr(media, "file_id", None):
+        return None
+    return {
+        "file_id": media.file_id,
+        "file_unique_id": media.file_unique_id,
+        "type": message.media.value,
+        "caption": message.caption.html[:1000] if message.caption else "",
+    }
+
+
 async def handle_reply(message, text, **kwargs):
     kwargs.pop("caption", None)
     kwargs.pop("text", None)
@@ -153,9 +169,11 @@ async def add_admin(user_id):
         if user_id not in admins:
             admins.append(user_id)
             await db.config.update_config("ADMINS", admins)
+            auth.admins.add(user_id)
             return True
     else:
         await db.config.add_config("ADMINS", [user_id])
+        auth.admins.add(user_id)
         return True
 
     return False
@@ -168,6 +186,7 @@ async def remove_admin(user_id):
         if user_id in admins:
             admins.remove(user_id)
             await db.config.update_config("ADMINS", admins)
+            auth.admins.discard(user_id)
             return True
     return False
 
@@ -182,52 +201,13 @@ async def ensure_config():
     await ensure_config_entry("message_delete_time", 0)
     await ensure_config_entry("file_delete_time", 0)
     await ensure_config_entry("force_sub_config", {})
-    await ensure_config_entry("request_joins", {})
-
-
-async def add_request_join(chat_id, user_id):
-    request_joins = await db.config.get_config("request_joins")
-    request_joins = request_joins.get("value", {})
-    if str(chat_id) not in request_joins:
-        request_joins[str(chat_id)] = []
-    if user_id not in request_joins[str(chat_id)]:
-        request_joins[str(chat_id)].append(user_id)
-        await db.config.update_config("request_joins", request_joins)
-        return True
-    return False
 
 
 async def is_user_in_request_join(chat_id, user_id):
-    request_joins = await db.config.get_config("request_joins")
-    request_joins = request_joins.get("value", {})
-    if str(chat_id) in request_joins:
-        if user_id in request_joins[str(chat_id)]:
-            return True
-    return False
-
-
-async def process_delete_schedule(bot):
-    schedules = await db.del_schedule.filter_schedules({"status": False})
-    for schedule in schedules:
-        sc = bot.sc
-        sc.add_job(
-            process_delete_schedule_single,
-            args=(bot, schedule),
-            trigger="date",
-            run_date=datetime.datetime.now() + datetime.timedelta(seconds=5),
-        )
-
-
-async def process_delete_schedule_single(bot, schedule):
-    chat_id = schedule["chat_id"]
-    message_id = schedule["message_id"]
-    time = schedule["time"]
-    if time < datetime.datetime.now():
-        try:
-            await bot.delete_messages(chat_id, message_id)
-        except errors.MessageDeleteForbidden:
-            pass
-        await db.del_schedule.update_schedule(chat_id, message_id, True)
+    # requests are written in batches, the newest ones are still queued
+    if join_requests.is_queued(chat_id, user_id):
+        return True
+    return await db.request_joins.is_requested(chat_id, user_id)
 
 
 def check(func):
@@ -236,14 +216,8 @@ def check(func):
     @functools.wraps(func)
     async def wrapper(client: Client, message):
         chat_id = getattr(message.from_user, "id", None)
-        admins = await get_admins()
-
-        if chat_id not in admins:
-            return
 
-        banned_users = await db.users.get_all_banned_users()
-        banned_users_ids = [user["_id"] for user in banned_users]
-        if chat_id in banned_users_ids:
+        if not auth.is_admin(chat_id) or auth.is_banned(chat_id):
             return
 
         return await func(client, message)
@@ -1,18 +1,151 @@
+import logging
+import time
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
 from .files import FilesDB
 from .users import UsersDB
 from bot.config import Config
 from .config import ConfigDB
+from .broadcasts import BroadcastsDB
+from .counters import CounterBuffer
 from .del_schedule import DelDB
+from .memberships import MembershipsDB
+from .request_joins import RequestJoinsDB
+from .stats import StatsDB
 
 __all__ = ["FilesDB", "UsersDB"]
 
 
+def get_client(uri):
+    """Build the one motor client shared by every collection wrapper"""
+    options = {
+        "maxPoolSize": Config.DATABASE_MAX_POOL_SIZE,
+        "minPoolSize": Config.DATABASE_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": Config.DATABASE_TIMEOUT_MS,
+        "connectTimeoutMS": Config.DATABASE_TIMEOUT_MS,
+        "readPreference": Config.DATABASE_READ_PREFERENCE,
+    }
+    if Config.DATABASE_COMPRESSORS:
+        options["compressors"] = Config.DATABASE_COMPRESSORS
+    return AsyncIOMotorClient(uri, **options)
+
+
+async def ensure_ttl_index(col, field, seconds):
+    """Create a TTL index on ``field``, or update its expiry if it changed"""
+    try:
+        await col.create_index(field, expireAfterSeconds=seconds)
+    except OperationFailure:
+        await col.database.command(
+            "collMod",
+            col.name,
+            index={"keyPattern": {field: 1}, "expireAfterSeconds": seconds},
+        )
+
+
+def find_stage(plan, stage):
+    """Check if an explain plan tree contains the given stage"""
+    if isinstance(plan, dict):
+        if plan.get("stage") == stage:
+            return True
+        return any(find_stage(value, stage) for value in plan.values())
+    if isinstance(plan, list):
+        return any(find_stage(value, stage) for value in plan)
+    return False
+
+
 class Database:
     def __init__(self, uri, database_name):
-        self.users = UsersDB(uri, database_name)
-        self.files = FilesDB(uri, database_name)
-        self.config = ConfigDB(uri, database_name)
-        self.del_schedule = DelDB(uri, database_name)
+        self._client = get_client(uri)
+        self.db = self._client[database_name]
+        self.counters = CounterBuffer(self.db, Config.COUNTER_MAX_PENDING)
+        self.stats = StatsDB(self.db, self.counters)
+        self.users = UsersDB(self.db, self.stats)
+        self.files = FilesDB(
+            self.db,
+            self.stats,
+            Config.LINK_CACHE_SIZE,
+            Config.LINK_CACHE_TTL,
+            Config.UNKNOWN_LINK_TTL,
+        )
+        self.config = ConfigDB(self.db, Config.CONFIG_CACHE_TTL)
+        self.del_schedule = DelDB(self.db, Config.DEL_SCHEDULE_RETENTION)
+        self.request_joins = RequestJoinsDB(self.db)
+        self.broadcasts = BroadcastsDB(self.db)
+        self.memberships = MembershipsDB(self.db, Config.MEMBERSHIP_TTL)
+
+    async def ping(self):
+        """Round trip a ping to the server and return the latency in ms"""
+        start = time.perf_counter()
+        await self.db.command("ping")
+        latency = (time.perf_counter() - start) * 1000
+        logging.info(f"Database ping: {latency:.1f} ms")
+        return latency
+
+    @property
+    def collections(self):
+        return [
+            self.users,
+            self.files,
+            self.config,
+            self.del_schedule,
+            self.request_joins,
+            self.broadcasts,
+            self.memberships,
+        ]
+
+    async def ensure_indexes(self):
+        for collection in self.collections:
+            try:
+                await collection.create_indexes()
+                # a wrapper names its TTL index as a (field, seconds) pair
+                ttl_index = getattr(collection, "ttl_index", None)
+                if ttl_index:
+                    await ensure_ttl_index(collection.col, *ttl_index)
+            except OperationFailure as e:
+                logging.error(f"Could not create indexes on {collection.col.name}: {e}")
+
+    async def migrate(self):
+        """Run the one-time data migrations, each of them is a no-op once done"""
+        migrated = await self.request_joins.migrate_from_config(self.config)
+        if migrated is not None:
+            logging.info(f"Migrated {migrated} join requests out of the config")
+
+        migrated = await self.files.migrate_locations(self.config)
+        if migrated:
+            logging.info(f"Migrated {migrated} files to chat_id/message_id fields")
+
+        migrated = await self.del_schedule.migrate_done_at(self.config)
+        if migrated:
+            logging.info(f"Stamped {migrated} old done schedules for expiry")
+
+        await self.stats.rebuild()
+        await self.stats.refresh()
+
+    async def check_query_plans(self):
+        """Explain every wrapper query and fail if any of them is a COLLSCAN.
+
+        A wrapper lists the scans it runs on purpose in ``accepted_scans``.
+        """
+        collscans = []
+        for collection in self.collections:
+            accepted = getattr(collection, "accepted_scans", ())
+            for name, cursor in collection.query_plans().items():
+                plan = await cursor.explain()
+                winning_plan = plan["queryPlanner"]["winningPlan"]
+                if not find_stage(winning_plan, "COLLSCAN"):
+                    continue
+                query = f"{type(collection).__name__}.{name}"
+                if name in accepted:
+                    logging.info(f"{query} scans the collection by design")
+                else:
+                    collscans.append(query)
+
+        if collscans:
+            raise RuntimeError(f"Queries without an index: {', '.join(collscans)}")
+        logging.info("All database queries use an index")
+
+    def close(self):
+        self._client.close()
 
 
 db = Database(Config.DATABASE_URL, Config.DATABASE_NAME)
@@ -0,0 +1,120 @@
+import datetime
+
+RUNNING = "running"
+PAUSED = "paused"
+CANCELLED = "cancelled"
+DONE = "done"
+FAILED = "failed"
+
+COUNTS = ("success", "blocked", "deleted", "failed")
+
+
+class BroadcastsDB:
+    def __init__(self, db):
+        self.db = db
+        self.col = self.db["broadcasts"]
+
+    async def create_indexes(self):
+        await self.col.create_index("status")
+
+    def query_plans(self):
+        return {
+            "get_unclaimed": self.col.find(
+                {
+                    "status": RUNNING,
+                    "lease_expires": {"$not": {"$gte": datetime.datetime.now()}},
+                }
+            ),
+        }
+
+    async def add_broadcast(self, chat_id, message_id, total):
+        """Record a broadcast of the message ``message_id`` in ``chat_id``"""
+        broadcast = {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "status": RUNNING,
+            "last_user_id": None,
+            "total": total,
+            "done": 0,
+            **{name: 0 for name in COUNTS},
+            "created_at": datetime.datetime.now(datetime.timezone.utc),
+        }
+        result = await self.col.insert_one(broadcast)
+        broadcast["_id"] = result.inserted_id
+        return broadcast
+
+    async def get_broadcast(self, broadcast_id):
+        return await self.col.find_one({"_id": broadcast_id})
+
+    async def get_unclaimed(self):
+        """Running jobs that no instance holds a lease on"""
+        return await self.col.find(
+            {
+                "status": RUNNING,
+                "lease_expires": {"$not": {"$gte": datetime.datetime.now()}},
+            }
+        ).to_list(None)
+
+    async def claim(self, broadcast_id, owner, lease_seconds):
+        """Lease a running job to ``owner`` and return it, None if held elsewhere"""
+        now = datetime.datetime.now()
+        return await self.col.find_one_and_update(
+            {
+                "_id": broadcast_id,
+                "status": RUNNING,
+                "$or": [
+                    {"lease_owner": owner},
+                    {"lease_expires": {"$not": {"$gte": now}}},
+                ],
+            },
+            {
+                "$set": {
+                    "lease_owner": owner,
+                    "lease_expires": now + datetime.timedelta(seconds=lease_seconds),
+                }
+            },
+            return_document=True,
+        )
+
+    async def renew_lease(self, broadcast_id, owner, lease_seconds):
+        expires = datetime.datetime.now() + datetime.timedelta(seconds=lease_seconds)
+        result = await self.col.update_one(
+            {"_id": broadcast_id, "lease_owner": owner},
+            {"$set": {"lease_expires": expires}},
+        )
+        return result.matched_count > 0
+
+    async def release(self, broadcast_id, owner):
+        await self.col.update_one(
+            {"_id": broadcast_id, "lease_owner": owner},
+            {"$unset": {"lease_owner": "", "lease_expires": ""}},
+        )
+
+    async def set_status_message(self, broadcast_id, chat_id, message_id):
+        await self.col.update_one(
+            {"_id": broadcast_id},
+            {"$set": {"status_chat_id": chat_id, "status_message_id": message_id}},
+        )
+
+    async def checkpoint(self, broadcast_id, owner, lease_seconds, last_user_id, counts):
+        """Save the progress of one processed chunk and return the job.
+
+        The lease is renewed with it, None is returned if ``owner`` lost it.
+        """
+        expires = datetime.datetime.now() + datetime.timedelta(seconds=lease_seconds)
+        return await self.col.find_one_and_update(
+            {"_id": broadcast_id, "lease_owner": owner},
+            {
+                "$set": {"last_user_id": last_user_id, "lease_expires": expires},
+                "$inc": {"done": sum(counts.values()), **counts},
+            },
+            return_document=True,
+        )
+
+    async def set_status(self, broadcast_id, status, current=None):
+        """Change the status, only from ``current`` if given"""
+        query = {"_id": broadcast_id}
+        if current:
+            query["status"] = current
+        result = await self.col.update_one(query, {"$set": {"status": status}})
+        return result.modified_count > 0
@@ -0,0 +1,63 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class TTLCache:
+    """In-process cache whose entries expire ``ttl`` seconds after being set"""
+
+    def __init__(self, ttl, maxsize=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=MISSING):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        if self.maxsize:
+            self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        if self.maxsize:
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SingleFlight:
+    """Lets concurrent callers of the same key share one in-flight lookup"""
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, func, *args):
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func(*args))
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+        # a cancelled caller must not cancel the lookup the others wait on
+        return await asyncio.shield(future)
@@ -1,25 +1,111 @@
-from motor.motor_asyncio import AsyncIOMotorClient
-
+import asyncio
+import copy
+import logging
+from pymongo.errors import OperationFailure, PyMongoError
+from .cache import MISSING, TTLCache
 
 
 class ConfigDB:
-    def __init__(self, uri, database_name):
-        self._client = AsyncIOMotorClient(uri)
-        self.db = self._client[database_name]
+    def __init__(self, db, cache_ttl=60):
+        self.db = db
         self.col = self.db["config"]
+        self.cache = TTLCache(cache_ttl)
+        self._invalidations = 0
+
+    async def create_indexes(self):
+        await self.col.create_index("name", unique=True)
+
+    def query_plans(self):
+        return {
+            "get_config": self.col.find({"name": "ADMINS"}),
+        }
 
     async def add_config(self, name, value):
         item = {
             "name": name,
             "value": value,
         }
-        return await self.col.insert_one(item)
+        result = await self.col.insert_one(item)
+        self.invalidate(name)
+        return result
 
     async def get_config(self, name):
-        return await self.col.find_one({"name": name})
+        config = self.cache.get(name)
+        if config is MISSING:
+            invalidations = self._invalidations
+            config = await self.col.find_one({"name": name})
+            # an entry changed during the lookup is not cached
+            if invalidations == self._invalidations:
+                self.cache.set(name, config)
+        # callers edit the value in place before writing it back
+        return copy.deepcopy(config)
+
+    def invalidate(self, name=None):
+        """Drop one cached entry, or all of them without a name"""
+        self._invalidations += 1
+        if name is None:
+            self.cache.clear()
+        else:
+            self.cache.pop(name)
+
+    async def get_value(self, name, default=None):
+        config = await self.get_config(name)
+        return config.get("value", default) if config else default
 
     async def delete_config(self, name):
-        return await self.col.delete_one({"name": name})
+        result = await self.col.delete_one({"name": name})
+        self.invalidate(name)
+        return result
 
     async def update_config(self, name, value):
-        return await self.col.update_one({"name": name}, {"$set": {"value": value}})
\ No newline at end of file
+        result = await self.col.update_one({"name": name}, {"$set": {"value": value}})
+        self.invalidate(name)
+        return result
+
+    async def set_item(self, name, key, value):
+        """Set one key of a dict valued entry, creating the entry if missing"""
+        result = await self.col.update_one(
+            {"name": name}, {"$set": {f"value.{key}": value}}, upsert=True
+        )
+        self.invalidate(name)
+        return result
+
+    async def unset_item(self, name, key):
+        result = await self.col.update_one(
+            {"name": name}, {"$unset": {f"value.{key}": ""}}
+        )
+        self.invalidate(name)
+        return result
+
+    async def watch(self, max_delay=60):
+        """Drop cached entries as soon as any replica changes them.
+
+        The stream is reopened after an error, from the last change seen when
+        the server still has it, with a growing delay between attempts.
+        """
+        resume_token = None
+        delay = 1
+        while True:
+            try:
+                async with self.col.watch(
+                    full_document="updateLookup", resume_after=resume_token
+                ) as stream:
+                    delay = 1
+                    async for change in stream:
+                        document = change.get("fullDocument")
+                        if document:
+                            self.invalidate(document["name"])
+                        else:
+                            self.invalidate()
+                        resume_token = stream.resume_token
+            except OperationFailure as e:
+                # the resume point may be gone from the oplog, start from now
+                logging.error(f"Config change stream failed, restarting: {e}")
+                resume_token = None
+            except PyMongoError as e:
+                logging.error(f"Config change stream stopped, resuming: {e}")
+
+            # changes made while the stream was down may have been missed
+            self.invalidate()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_delay)
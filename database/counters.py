@@ -0,0 +1,52 @@
+import asyncio
+import logging
+from collections import Counter, defaultdict
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+
+class CounterBuffer:
+    """Write-behind buffer for ``$inc`` counters"""
+
+    def __init__(self, db, max_pending=1000):
+        self.db = db
+        self.max_pending = max_pending
+        self._pending = Counter()
+        self._lock = asyncio.Lock()
+        self._flush_task = None
+
+    def incr(self, collection, _id, field, amount=1):
+        self._pending[(collection, _id, field)] += amount
+        if len(self._pending) >= self.max_pending and not self._flushing:
+            self._flush_task = asyncio.create_task(self.flush())
+
+    @property
+    def _flushing(self):
+        return self._flush_task is not None and not self._flush_task.done()
+
+    async def flush(self):
+        async with self._lock:
+            pending, self._pending = self._pending, Counter()
+            if not pending:
+                return
+
+            updates = defaultdict(lambda: defaultdict(dict))
+            for (collection, _id, field), amount in pending.items():
+                updates[collection][_id][field] = amount
+
+            for collection, documents in updates.items():
+                operations = [
+                    UpdateOne({"_id": _id}, {"$inc": fields})
+                    for _id, fields in documents.items()
+                ]
+                try:
+                    await self.db[collection].bulk_write(operations, ordered=False)
+                except BulkWriteError as e:
+                    # the rest of the batch was applied, retrying would double count
+                    logging.error(f"Dropped {collection} counters: {e.details}")
+                except PyMongoError as e:
+                    logging.error(f"Could not flush {collection} counters: {e}")
+                    # keep them for the next flush
+                    for _id, fields in documents.items():
+                        for field, amount in fields.items():
+                            self._pending[(collection, _id, field)] += amount
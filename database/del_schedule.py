@@ -1,27 +1,136 @@
-from motor.motor_asyncio import AsyncIOMotorClient
+import datetime
 
 
 class DelDB:
-    def __init__(self, uri, database_name):
-        self._client = AsyncIOMotorClient(uri)
-        self.db = self._client[database_name]
+    def __init__(self, db, retention=86400):
+        self.db = db
         self.col = self.db["del_schedule"]
+        self.ttl_index = ("done_at", retention)
+
+    async def create_indexes(self):
+        await self.col.create_index([("status", 1), ("time", 1)])
+
+    def query_plans(self):
+        now = datetime.datetime.now()
+        return {
+            "filter_schedules": self.col.find({"status": False}),
+            "get_due_schedules": self._due_schedules(now),
+            "claim_schedules": self.col.find(self._claimable([0], "", now)),
+            "get_backlog": self.col.find({"status": False}).sort("time", 1),
+            "migrate_done_at": self.col.find(self._legacy_done()),
+        }
+
+    def _due_schedules(self, until):
+        query = {
+            "status": False,
+            "time": {"$lte": until},
+            "lease_expires": {"$not": {"$gte": datetime.datetime.now()}},
+        }
+        return self.col.find(query).sort("time", 1)
+
+    def _claimable(self, schedule_ids, owner, now):
+        return {
+            "_id": {"$in": schedule_ids},
+            "status": False,
+            "$or": [
+                {"lease_owner": owner},
+                {"lease_expires": {"$not": {"$gte": now}}},
+            ],
+        }
+
+    def _legacy_done(self):
+        return {"status": True, "done_at": {"$exists": False}}
 
     async def add_schedule(self, chat_id, message_id, time, status=False):
-        await self.col.insert_one(
-            {
-                "chat_id": chat_id,
-                "message_id": message_id,
-                "time": time,
-                "status": status,
-            }
-        )
+        schedule = {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "time": time,
+            "status": status,
+        }
+        await self.col.insert_one(schedule)
+        return schedule
+
+    async def add_schedules(self, schedules):
+        """Insert several ``chat_id``/``message_id``/``time`` schedules in one write"""
+        schedules = [dict(schedule, status=False) for schedule in schedules]
+        if schedules:
+            await self.col.insert_many(schedules, ordered=False)
+        return schedules
 
     async def filter_schedules(self, query):
         return await self.col.find(query).to_list(None)
 
+    async def get_due_schedules(self, until):
+        """Pending, unleased schedules due at or before ``until``, soonest first"""
+        return await self._due_schedules(until).to_list(None)
+
+    async def claim_schedules(self, schedule_ids, owner, lease_seconds):
+        """Lease pending schedules to ``owner`` and return the ones it now holds.
+
+        Rows leased by another worker are skipped until their lease expires,
+        so every row is processed by one worker at a time.
+        """
+        now = datetime.datetime.now()
+        await self.col.update_many(
+            self._claimable(schedule_ids, owner, now),
+            {
+                "$set": {
+                    "lease_owner": owner,
+                    "lease_expires": now + datetime.timedelta(seconds=lease_seconds),
+                }
+            },
+        )
+        return await self.col.find(
+            {"_id": {"$in": schedule_ids}, "status": False, "lease_owner": owner}
+        ).to_list(None)
+
+    async def renew_leases(self, schedule_ids, owner, lease_seconds):
+        expires = datetime.datetime.now() + datetime.timedelta(seconds=lease_seconds)
+        await self.col.update_many(
+            {"_id": {"$in": schedule_ids}, "lease_owner": owner},
+            {"$set": {"lease_expires": expires}},
+        )
+
     async def update_schedule(self, chat_id, message_id, status=True):
         await self.col.update_one(
             {"chat_id": chat_id, "message_id": message_id},
             {"$set": {"status": status}},
         )
+
+    async def mark_done(self, schedule_ids):
+        if schedule_ids:
+            await self.col.update_many(
+                {"_id": {"$in": schedule_ids}},
+                {
+                    # TTL indexes compare against UTC
+                    "$set": {
+                        "status": True,
+                        "done_at": datetime.datetime.now(datetime.timezone.utc),
+                    },
+                    "$unset": {"lease_owner": "", "lease_expires": ""},
+                },
+            )
+
+    async def get_backlog(self):
+        """Number of pending schedules and the oldest of them"""
+        pending = await self.col.count_documents({"status": False})
+        oldest = await self.col.find_one({"status": False}, sort=[("time", 1)])
+        return pending, oldest
+
+    async def migrate_done_at(self, config):
+        """Stamp completed rows written before the TTL index existed, so the
+        TTL monitor removes them with the rest.
+
+        Recorded in the ``migrations`` config entry once a run finds none left.
+        """
+        if (await config.get_value("migrations", {})).get("done_at"):
+            return 0
+
+        result = await self.col.update_many(
+            self._legacy_done(),
+            {"$set": {"done_at": datetime.datetime.now(datetime.timezone.utc)}},
+        )
+        if not result.modified_count:
+            await config.set_item("migrations", "done_at", True)
+        return result.modified_count
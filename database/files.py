@@ -1,27 +1,210 @@
-from motor.motor_asyncio import AsyncIOMotorClient
+import datetime
+import logging
+import time
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from .bloom import BloomFilter
+from .cache import MISSING, SingleFlight, TTLCache
 
 
 class FilesDB:
-    def __init__(self, uri, database_name):
-        self._client = AsyncIOMotorClient(uri)
-        self.db = self._client[database_name]
+    # one-off backfills over fields no index can match as missing
+    accepted_scans = ("find_missing_unique_ids", "migrate_locations")
+
+    def __init__(self, db, stats, cache_size=10000, cache_ttl=300, unknown_ttl=60):
+        self.db = db
         self.col = self.db["files"]
+        self.stats = stats
+        # file and batch records of recently opened links, keyed by link id
+        self.cache = TTLCache(cache_ttl, cache_size)
+        self.flights = SingleFlight()
+        self._invalidations = 0
+        # every known link id, so unknown ones are answered without a query
+        self.ids = None
+        self.ids_synced_at = None
+        self._ids_refreshed = 0
+        self.unknown = TTLCache(unknown_ttl, cache_size)
+        self.unknown_links = 0
+
+    async def create_indexes(self):
+        # message_id first so filter_file can seek on it without a chat_id
+        await self.col.create_index([("message_id", 1), ("chat_id", 1)])
+        await self.col.create_index("user_id")
+        await self.col.create_index("created_at")
+        # one stored copy per media, aliases and text posts are left out
+        await self.col.create_index(
+            "file_unique_id",
+            unique=True,
+            partialFilterExpression={"file_unique_id": {"$type": "string"}},
+        )
+
+    def query_plans(self):
+        return {
+            "get_file_by_location": self.col.find({"chat_id": 0, "message_id": 0}),
+            "filter_file": self.col.find({"message_id": 0}),
+            "get_user_files_count": self.col.find({"user_id": 0}),
+            "load_ids": self._ids(),
+            "refresh_ids": self._ids(datetime.datetime.now(datetime.timezone.utc)),
+            "get_file_by_unique_id": self.col.find({"file_unique_id": ""}),
+            "find_missing_unique_ids": self.find_missing_unique_ids(),
+            "migrate_locations": self._legacy_locations(),
+        }
+
+    def _legacy_locations(self):
+        return self.col.find({"log": {"$exists": True}}, {"log": 1})
+
+    def _ids(self, since=None):
+        """Link ids, all of them or those created since ``since``"""
+        if since is not None:
+            return self.col.find({"created_at": {"$gte": since}}, {"_id": 1})
+        # read from the _id index alone, it is much smaller than the documents
+        return self.col.find({}, {"_id": 1}).hint([("_id", 1)])
 
     async def add_file(
         self,
         id,
         user_id,
-        log,
+        chat_id,
+        message_id,
+        media=None,
     ):
         file = {
             "_id": id,
             "user_id": user_id,
-            "log": log,
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "media": media,
+            "created_at": datetime.datetime.now(datetime.timezone.utc),
         }
-        return await self.col.insert_one(file)
+        if media:
+            file["file_unique_id"] = media["file_unique_id"]
+        # raises DuplicateKeyError if the media is already stored
+        result = await self.col.insert_one(file)
+        self.add_id(id)
+        self.stats.incr("files")
+        return result
+
+    async def add_files(self, user_id, files):
+        """Insert ``(id, chat_id, message_id, media)`` files with one insert_many.
+
+        Returns the ids that were not inserted because their media is
+        already stored.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        documents = []
+        for id, chat_id, message_id, media in files:
+            file = {
+                "_id": id,
+                "user_id": user_id,
+                "chat_id": chat_id,
+                "message_id": message_id,
+                "media": media,
+                "created_at": now,
+            }
+            if media:
+                file["file_unique_id"] = media["file_unique_id"]
+            documents.append(file)
+
+        failed = set()
+        duplicates = []
+        try:
+            await self.col.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details["writeErrors"]:
+                _id = documents[error["index"]]["_id"]
+                failed.add(_id)
+                if error["code"] == 11000:
+                    duplicates.append(_id)
+                else:
+                    logging.error(f"Could not store file {_id}: {error['errmsg']}")
+
+        for file in documents:
+            if file["_id"] not in failed:
+                self.add_id(file["_id"])
+        self.stats.incr("files", len(documents) - len(failed))
+        return duplicates
+
+    async def get_file_by_unique_id(self, file_unique_id):
+        return await self.col.find_one({"file_unique_id": file_unique_id})
+
+    async def get_files_by_unique_ids(self, file_unique_ids):
+        """Map the stored ones of ``file_unique_ids`` to their link id"""
+        cursor = self.col.find(
+            {"file_unique_id": {"$in": list(file_unique_ids)}}, {"file_unique_id": 1}
+        )
+        return {file["file_unique_id"]: file["_id"] async for file in cursor}
+
+    async def get_link(self, _id):
+        """Return the file or batch record of a link, cached.
+
+        The record is shared between callers and must not be modified.
+        """
+        file = self.cache.get(_id)
+        if file is not MISSING:
+            return file
+        if not await self.may_exist(_id):
+            self.unknown_links += 1
+            return None
+        return await self.flights.do(_id, self._load_link, _id)
+
+    async def _load_link(self, _id):
+        invalidations = self._invalidations
+        file = await self.col.find_one({"_id": _id})
+        if file is None:
+            self.unknown.set(_id, True)
+        # a link deleted or changed during the lookup is not cached
+        elif invalidations == self._invalidations:
+            self.cache.set(_id, file)
+        return file
+
+    async def may_exist(self, _id):
+        if self.unknown.get(_id) is not MISSING:
+            return False
+        if self.ids is None or _id in self.ids:
+            return True
+        # the link may have been created by another instance since the last sync
+        if time.monotonic() - self._ids_refreshed >= 1:
+            await self.flights.do("refresh_ids", self.refresh_ids)
+        return _id in self.ids
+
+    def add_id(self, _id):
+        if self.ids is not None:
+            self.ids.add(_id)
+        self.unknown.pop(_id)
+
+    async def load_ids(self, batch_size=5000):
+        """Build the link id filter from a projected scan of the collection"""
+        synced_at = datetime.datetime.now(datetime.timezone.utc)
+        count = await self.col.estimated_document_count()
+        ids = BloomFilter(max(100000, count * 2))
+        async for file in self._ids().batch_size(batch_size):
+            ids.add(file["_id"])
+        self.ids, self.ids_synced_at = ids, synced_at
+        self._ids_refreshed = time.monotonic()
+        logging.info(f"Loaded {ids.count} link ids")
+
+    async def refresh_ids(self):
+        """Add link ids created since the last sync, by any instance"""
+        if self.ids is None:
+            return
+        if self.ids.full:
+            return await self.load_ids()
+
+        synced_at = datetime.datetime.now(datetime.timezone.utc)
+        # allow for clock skew between instances
+        since = self.ids_synced_at - datetime.timedelta(seconds=30)
+        async for file in self._ids(since):
+            self.ids.add(file["_id"])
+        self.ids_synced_at = synced_at
+        self._ids_refreshed = time.monotonic()
+
+    def invalidate(self, _id):
+        self._invalidations += 1
+        self.cache.pop(_id)
+        self.unknown.pop(_id)
 
     async def get_file_by_id(self, file_id):
-        return await self.col.find_one({"_id": file_id})
+        return await self.get_link(file_id)
 
     async def get_user_files_count(self, user_id):
         return await self.col.count_documents({"user_id": user_id})
@@ -31,28 +214,156 @@ class FilesDB:
             "_id": id,
             "user_id": user_id,
             "files": files,
+            "created_at": datetime.datetime.now(datetime.timezone.utc),
         }
-        return await self.col.insert_one(batch)
+        result = await self.col.insert_one(batch)
+        self.add_id(id)
+        self.stats.incr("batches")
+        return result
 
     async def get_batch(self, batch_id):
-        return await self.col.find_one({"_id": batch_id})
+        return await self.get_link(batch_id)
+
+    async def set_media(self, file_id, media):
+        result = await self.col.update_one({"_id": file_id}, {"$set": {"media": media}})
+        self.invalidate(file_id)
+        return result
+
+    async def set_batch_media(self, batch_id, medias):
+        """Set the media descriptors of several batch items, keyed by index"""
+        result = await self.col.update_one(
+            {"_id": batch_id},
+            {"$set": {f"files.{index}.media": media for index, media in medias.items()}},
+        )
+        self.invalidate(batch_id)
+        return result
+
+    async def delete_file_by_location(self, chat_id, message_id):
+        file = await self.col.find_one_and_delete(
+            {"chat_id": chat_id, "message_id": message_id}, {"_id": 1}
+        )
+        if file:
+            self.invalidate(file["_id"])
+            self.unknown.set(file["_id"], True)
+            self.stats.incr("files", -1)
+        return file
 
-    async def delete_file_by_log(self, log):
-        return await self.col.delete_one({"log": log})
-    
     async def delete_file_by_id(self, file_id):
-        return await self.col.delete_one({"_id": file_id})
+        file = await self.col.find_one_and_delete({"_id": file_id}, {"files": 1})
+        self.invalidate(file_id)
+        # the filter cannot forget an id, the negative cache covers it
+        self.unknown.set(file_id, True)
+        if file:
+            self.stats.incr("batches" if "files" in file else "files", -1)
+        return file
 
-    async def get_file_by_log(self, log):
-        return await self.col.find_one({"log": log})
-    
-    async def get_batch(self, batch_id):
-        return await self.col.find_one({"_id": batch_id})
+    async def get_file_by_location(self, chat_id, message_id):
+        return await self.col.find_one({"chat_id": chat_id, "message_id": message_id})
 
-    async def filter_file(self, log):
-        file =  await self.col.find_one({"log": log})
+    async def filter_file(self, chat_id, message_id):
+        file = await self.get_file_by_location(chat_id, message_id)
         if not file:
-            file_id = log.split("-", 1)[0]
-            # search in log field for file_id with any chat_id
-            file = await self.col.find_one({"log": {"$regex": f"^{file_id}-"}})
-        return file
\ No newline at end of file
+            # same message id in any chat
+            file = await self.col.find_one({"message_id": message_id})
+        return file
+
+    def find_missing_unique_ids(self, batch_size=200):
+        """Files stored before file_unique_id was recorded"""
+        return self.col.find(
+            {
+                "file_unique_id": {"$exists": False},
+                "alias_of": {"$exists": False},
+                "files": {"$exists": False},
+            },
+            {"chat_id": 1, "message_id": 1, "media": 1},
+        ).batch_size(batch_size)
+
+    async def get_unique_locations(self):
+        """Map every recorded file_unique_id to its file"""
+        locations = {}
+        cursor = self.col.find(
+            {"file_unique_id": {"$type": "string"}},
+            {"file_unique_id": 1, "chat_id": 1, "message_id": 1, "media": 1},
+        )
+        async for file in cursor.batch_size(5000):
+            locations[file["file_unique_id"]] = file
+        return locations
+
+    async def merge_unique_ids(self, files, locations):
+        """Record the file_unique_id of ``(file, media)`` pairs.
+
+        The first file of each media keeps it, later ones become aliases that
+        point at its location, so their links keep working. ``locations`` is
+        the map from ``get_unique_locations`` and is updated in place.
+        Returns the number of aliases made.
+        """
+        operations = []
+        aliases = 0
+        for file, media in files:
+            if not media:
+                # nothing to deduplicate, don't look at it again
+                update = {"$set": {"file_unique_id": None}}
+            else:
+                canonical = locations.get(media["file_unique_id"])
+                if canonical is None:
+                    locations[media["file_unique_id"]] = {**file, "media": media}
+                    update = {
+                        "$set": {"file_unique_id": media["file_unique_id"], "media": media}
+                    }
+                else:
+                    update = {
+                        "$set": {
+                            "alias_of": canonical["_id"],
+                            "chat_id": canonical["chat_id"],
+                            "message_id": canonical["message_id"],
+                            "media": canonical.get("media") or media,
+                        }
+                    }
+                    aliases += 1
+            operations.append(UpdateOne({"_id": file["_id"]}, update))
+            self.invalidate(file["_id"])
+
+        if operations:
+            try:
+                await self.col.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                # stored concurrently by an upload, the next run merges them
+                logging.warning(f"Could not merge some duplicates: {e.details}")
+        return aliases
+
+    async def migrate_locations(self, config, batch_size=500):
+        """Split the legacy ``"{message_id}-{chat_id}"`` log field into typed fields
+
+        The scan has no index to use, so it runs until it finds nothing left and
+        is then recorded in the ``migrations`` config entry and skipped.
+        """
+        if (await config.get_value("migrations", {})).get("locations"):
+            return 0
+
+        migrated = 0
+        operations = []
+        async for file in self._legacy_locations().batch_size(batch_size):
+            message_id, chat_id = map(int, file["log"].split("-", 1))
+            operations.append(
+                UpdateOne(
+                    {"_id": file["_id"]},
+                    {
+                        "$set": {"chat_id": chat_id, "message_id": message_id},
+                        "$unset": {"log": ""},
+                    },
+                )
+            )
+            if len(operations) >= batch_size:
+                await self.col.bulk_write(operations, ordered=False)
+                migrated += len(operations)
+                operations = []
+
+        if operations:
+            await self.col.bulk_write(operations, ordered=False)
+            migrated += len(operations)
+
+        if "log_1" in await self.col.index_information():
+            await self.col.drop_index("log_1")
+        if not migrated:
+            await config.set_item("migrations", "locations", True)
+        return migrated
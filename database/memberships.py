@@ -0,0 +1,49 @@
+import datetime
+from pymongo import UpdateOne
+
+
+class MembershipsDB:
+    """Users known to be members of the force-sub channels, fed by chat events"""
+
+    def __init__(self, db, ttl=86400):
+        self.db = db
+        self.col = self.db["memberships"]
+        self.ttl_index = ("verified_at", ttl)
+
+    async def create_indexes(self):
+        await self.col.create_index([("user_id", 1), ("chat_id", 1)], unique=True)
+
+    def query_plans(self):
+        return {
+            "get_verified_chats": self.col.find({"user_id": 0, "chat_id": {"$in": [0]}}),
+        }
+
+    async def add_member(self, chat_id, user_id):
+        return await self.col.update_one(
+            {"user_id": user_id, "chat_id": chat_id},
+            {"$set": {"verified_at": datetime.datetime.now(datetime.timezone.utc)}},
+            upsert=True,
+        )
+
+    async def add_members(self, chat_id, user_ids):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return await self.col.bulk_write(
+            [
+                UpdateOne(
+                    {"user_id": user_id, "chat_id": chat_id},
+                    {"$set": {"verified_at": now}},
+                    upsert=True,
+                )
+                for user_id in user_ids
+            ],
+            ordered=False,
+        )
+
+    async def remove_member(self, chat_id, user_id):
+        return await self.col.delete_one({"user_id": user_id, "chat_id": chat_id})
+
+    async def get_verified_chats(self, user_id, chat_ids):
+        cursor = self.col.find(
+            {"user_id": user_id, "chat_id": {"$in": list(chat_ids)}}, {"chat_id": 1}
+        )
+        return {membership["chat_id"] async for membership in cursor}
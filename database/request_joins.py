@@ -0,0 +1,66 @@
+import datetime
+from pymongo import UpdateOne
+
+
+class RequestJoinsDB:
+    def __init__(self, db):
+        self.db = db
+        self.col = self.db["request_joins"]
+
+    async def create_indexes(self):
+        await self.col.create_index([("chat_id", 1), ("user_id", 1)], unique=True)
+
+    def query_plans(self):
+        return {
+            "is_requested": self.col.find({"chat_id": 0, "user_id": 0}),
+        }
+
+    async def add_request(self, chat_id, user_id):
+        result = await self.col.update_one(
+            {"chat_id": chat_id, "user_id": user_id},
+            {"$setOnInsert": {"time": datetime.datetime.now()}},
+            upsert=True,
+        )
+        return result.upserted_id is not None
+
+    async def add_requests(self, requests):
+        """Record ``(chat_id, user_id)`` pairs with one unordered bulk write"""
+        now = datetime.datetime.now()
+        return await self.col.bulk_write(
+            [
+                UpdateOne(
+                    {"chat_id": chat_id, "user_id": user_id},
+                    {"$setOnInsert": {"time": now}},
+                    upsert=True,
+                )
+                for chat_id, user_id in requests
+            ],
+            ordered=False,
+        )
+
+    async def is_requested(self, chat_id, user_id):
+        request = await self.col.find_one(
+            {"chat_id": chat_id, "user_id": user_id}, {"_id": 1}
+        )
+        return request is not None
+
+    async def migrate_from_config(self, config, batch_size=1000):
+        """Move the legacy ``request_joins`` config entry into this collection"""
+        request_joins = await config.get_config("request_joins")
+        if not request_joins:
+            return
+
+        operations = [
+            UpdateOne(
+                {"chat_id": int(chat_id), "user_id": user_id},
+                {"$setOnInsert": {"time": datetime.datetime.now()}},
+                upsert=True,
+            )
+            for chat_id, user_ids in request_joins.get("value", {}).items()
+            for user_id in user_ids
+        ]
+        for i in range(0, len(operations), batch_size):
+            await self.col.bulk_write(operations[i : i + batch_size], ordered=False)
+
+        await config.delete_config("request_joins")
+        return len(operations)
@@ -0,0 +1,45 @@
+import logging
+
+STATS_ID = "counters"
+FIELDS = ["files", "batches", "users", "banned", "downloads"]
+
+
+class StatsDB:
+    """Incrementally maintained totals for /stats"""
+
+    def __init__(self, db, counters):
+        self.db = db
+        self.col = self.db["stats"]
+        self.counters = counters
+        self.snapshot = dict.fromkeys(FIELDS, 0)
+
+    def incr(self, field, amount=1):
+        self.counters.incr("stats", STATS_ID, field, amount)
+
+    async def refresh(self):
+        stats = await self.col.find_one({"_id": STATS_ID})
+        if stats:
+            self.snapshot = {field: stats.get(field, 0) for field in FIELDS}
+        return self.snapshot
+
+    async def rebuild(self):
+        """Count everything once, used when the stats document does not exist yet"""
+        if await self.col.find_one({"_id": STATS_ID}, {"_id": 1}):
+            return
+
+        files = self.db["files"]
+        users = self.db["users"]
+        downloads = await users.aggregate(
+            [{"$group": {"_id": None, "total": {"$sum": "$files_received"}}}]
+        ).to_list(None)
+        stats = {
+            "files": await files.count_documents({"message_id": {"$exists": True}}),
+            "batches": await files.count_documents({"files": {"$exists": True}}),
+            "users": await users.count_documents({}),
+            "banned": await users.count_documents({"banned": True}),
+            "downloads": downloads[0]["total"] if downloads else 0,
+        }
+        await self.col.update_one(
+            {"_id": STATS_ID}, {"$setOnInsert": stats}, upsert=True
+        )
+        logging.info(f"Built stats document: {stats}")
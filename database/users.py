@@ -1,15 +1,47 @@
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DeleteOne, UpdateOne
 
 
 class UsersDB:
-    def __init__(self, uri, database_name):
-        self._client = AsyncIOMotorClient(uri)
-        self.db = self._client[database_name]
+    def __init__(self, db, stats):
+        self.db = db
         self.col = self.db["users"]
+        self.stats = stats
+
+    async def create_indexes(self):
+        await self.col.create_index(
+            "banned", partialFilterExpression={"banned": True}
+        )
+        # serves both the blocked count and the reachable users in _id order
+        await self.col.create_index([("blocked", 1), ("_id", 1)])
+        if "blocked_1" in await self.col.index_information():
+            await self.col.drop_index("blocked_1")
+
+    def query_plans(self):
+        return {
+            "get_all_banned_users": self.col.find({"banned": True}),
+            "reachable_users_count": self.col.find({"blocked": True}),
+            "get_user_ids": self.col.find({"blocked": None, "_id": {"$gt": 0}})
+            .sort("_id", 1)
+            .limit(500),
+        }
 
     async def add_user(self, user_id):
-        user = {"_id": user_id, "banned": False, "files_received": 0}
-        await self.col.insert_one(user)
+        """Insert the user if missing and tell whether it was new, in one round trip.
+
+        A user who blocked the bot and starts it again is reachable again.
+        """
+        result = await self.col.update_one(
+            {"_id": user_id},
+            {
+                "$setOnInsert": {"banned": False, "files_received": 0},
+                "$unset": {"blocked": ""},
+            },
+            upsert=True,
+        )
+        if result.upserted_id is None:
+            return False
+        self.stats.incr("users")
+        return True
 
     async def get_user(self, user_id):
         return await self.col.find_one({"_id": user_id})
@@ -17,14 +49,43 @@ class UsersDB:
     async def get_all_users(self):
         return await self.col.find({}).to_list(None)
 
+    async def total_users_count(self):
+        return await self.col.estimated_document_count()
+
+    async def reachable_users_count(self):
+        blocked = await self.col.count_documents({"blocked": True})
+        return await self.total_users_count() - blocked
+
+    async def get_user_ids(self, after=None, limit=500):
+        """The next ``limit`` reachable user ids in ``_id`` order after ``after``
+
+        ``blocked`` is only ever set to true or unset, so matching null picks
+        the reachable users with an equality on the ``blocked, _id`` index.
+        """
+        query = {"blocked": None}
+        if after is not None:
+            query["_id"] = {"$gt": after}
+        cursor = self.col.find(query, {"_id": 1}).sort("_id", 1).limit(limit)
+        return [user["_id"] async for user in cursor]
+
     async def update_user(self, user_id, data, tag="set"):
         return await self.col.update_one({"_id": user_id}, {f"${tag}": data})
 
     async def ban_user(self, user_id):
-        return await self.col.update_one({"_id": user_id}, {"$set": {"banned": True}})
+        result = await self.col.update_one(
+            {"_id": user_id}, {"$set": {"banned": True}}
+        )
+        if result.modified_count:
+            self.stats.incr("banned")
+        return result
 
     async def unban_user(self, user_id):
-        return await self.col.update_one({"_id": user_id}, {"$set": {"banned": False}})
+        result = await self.col.update_one(
+            {"_id": user_id}, {"$set": {"banned": False}}
+        )
+        if result.modified_count:
+            self.stats.incr("banned", -1)
+        return result
 
     async def is_user_banned(self, user_id):
         user = await self.get_user(user_id)
@@ -33,5 +94,31 @@ class UsersDB:
     async def get_all_banned_users(self):
         return await self.col.find({"banned": True}).to_list(None)
 
+    async def get_banned_user_ids(self):
+        return [user["_id"] async for user in self.col.find({"banned": True}, {"_id": 1})]
+
+    async def mark_unreachable(self, results):
+        """Flag users who blocked the bot and drop deleted accounts, in one write.
+
+        ``results`` maps user ids to ``"blocked"`` or ``"deleted"``. Banned
+        users are only flagged so the banned list stays intact.
+        """
+        operations = []
+        for user_id, result in results.items():
+            if result == "deleted":
+                operations.append(DeleteOne({"_id": user_id, "banned": {"$ne": True}}))
+            operations.append(
+                UpdateOne({"_id": user_id}, {"$set": {"blocked": True}})
+            )
+        result = await self.col.bulk_write(operations, ordered=False)
+        if result.deleted_count:
+            self.stats.incr("users", -result.deleted_count)
+        return result
+
     async def delete_user(self, user_id):
-        return await self.col.delete_one({"_id": user_id})
+        user = await self.col.find_one_and_delete({"_id": user_id}, {"banned": 1})
+        if user:
+            self.stats.incr("users", -1)
+            if user.get("banned"):
+                self.stats.incr("banned", -1)
+        return user
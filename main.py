@@ -2,13 +2,45 @@ from bot import Bot
 import os
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-from bot.utils import process_delete_schedule
+from bot.auth import auth
+from bot.broadcast import broadcaster
+from bot.config import Config
+from bot.digest import new_users
+from bot.join_requests import join_requests
+from bot.metrics import sampler
+from database import db
 
 if __name__ == "__main__":
     os.makedirs("downloads", exist_ok=True)
     sc = AsyncIOScheduler()
     sc.start()
     app = Bot()
-    app.sc = sc
-    sc.add_job(process_delete_schedule, "interval", seconds=10, args=(app,))
+    sc.add_job(db.counters.flush, "interval", seconds=Config.COUNTER_FLUSH_INTERVAL)
+    sc.add_job(
+        new_users.flush,
+        "interval",
+        seconds=Config.NEW_USER_DIGEST_INTERVAL,
+        args=(app,),
+    )
+    sc.add_job(
+        join_requests.flush,
+        "interval",
+        seconds=Config.JOIN_REQUEST_FLUSH_INTERVAL,
+        args=(app,),
+    )
+    sc.add_job(sampler.sample, "interval", seconds=Config.STATS_SAMPLE_INTERVAL)
+    sc.add_job(db.stats.refresh, "interval", seconds=Config.STATS_SAMPLE_INTERVAL)
+    sc.add_job(auth.load, "interval", seconds=Config.AUTH_RESYNC_INTERVAL)
+    # jobs of an instance that died are picked up once their lease expires
+    sc.add_job(
+        broadcaster.resume_running,
+        "interval",
+        seconds=Config.BROADCAST_LEASE_SECONDS,
+        args=(app,),
+    )
+    sc.add_job(
+        db.files.refresh_ids,
+        "interval",
+        seconds=Config.LINK_FILTER_REFRESH_INTERVAL,
+    )
     app.run()